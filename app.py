@@ -1,25 +1,52 @@
 import os
+import sys
 import uuid
 import subprocess
 import requests
 import time
-import pypdfium2 as pdfium
+import importlib
+import multiprocessing
 import json
 import threading
+import html
+import hmac
+import shutil
 from collections import deque
 from pathlib import Path
 from flask import Flask, render_template, request, send_file, jsonify, session, redirect, url_for, Response
 from werkzeug.utils import secure_filename
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import atexit
 import gc
 
-# Tentative d'import de torch pour surveillance précise (optionnel)
-try:
-    import torch
-    HAS_TORCH = True
-except ImportError:
-    HAS_TORCH = False
+# Modules lourds (torch, pypdfium2, reportlab) importés au premier usage pour un démarrage rapide
+_lazy_modules = {}
+_lazy_lock = threading.Lock()
+
+def lazy_import(name):
+    """Importe un module au premier appel ; None s'il n'est pas installé.
+
+    Le verrou ne protège que le cache : l'import lui-même se fait hors verrou
+    (importlib a ses propres verrous par module), un import de torch ne bloque donc
+    pas un import de pypdfium2 lancé en parallèle.
+    """
+    with _lazy_lock:
+        if name in _lazy_modules:
+            return _lazy_modules[name]
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        module = None
+    with _lazy_lock:
+        return _lazy_modules.setdefault(name, module)
+
+def get_cuda_torch():
+    """torch si installé et CUDA disponible, sinon None (surveillance précise optionnelle)"""
+    torch = lazy_import('torch')
+    if torch is not None and torch.cuda.is_available():
+        return torch
+    return None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'cle-multilingue-yomitoku-ollama-2024'
@@ -28,9 +55,24 @@ app.config['OUTPUT_FOLDER'] = 'output'
 app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024
 app.config['OLLAMA_TIMEOUT'] = 900
 app.config['OLLAMA_MODEL'] = 'qwen2.5:latest'
+app.config['PDF_WORKERS'] = 2
+app.config['PDF_PAGES_PER_TASK'] = 8
+app.config['TRANSLATED_PDF'] = True       # PDF traduit en plus du HTML (si reportlab est installé)
+app.config['MAX_CONCURRENT_JOBS'] = 4
+app.config['GPU_DEVICES'] = None        # None = tous les GPU détectés, sinon liste d'index (ex: [0, 1])
+app.config['REMOTE_WORKERS'] = []       # URLs des nœuds workers (ex: ['http://gpu-node-2:5001']), output/ partagé
+app.config['WORKER_MODE'] = False       # True = ce processus accepte les jobs d'un front-end (python app.py --worker)
+app.config['WORKER_TOKEN'] = None       # Jeton partagé, obligatoire en mode worker (en-tête X-Worker-Token)
+app.config['MAX_QUEUE_WAIT'] = 1800     # Attente estimée max (s) avant de refuser un upload (503)
+app.config['MAX_QUEUED_JOBS'] = 50      # Nombre max de jobs en file, tous utilisateurs (503)
+app.config['SESSION_MAX_JOBS'] = 3      # Jobs en file max par session (429)
+app.config['SESSION_MAX_PAGES'] = 500   # Pages en file max par session (429)
+app.config['DEFAULT_SECONDS_PER_PAGE'] = {'cuda': 4.0, 'cpu': 30.0}
 
 # Configuration critique pour la mémoire GPU
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
+# Index CUDA = index nvidia-smi (CUDA_VISIBLE_DEVICES des sous-processus OCR)
+os.environ.setdefault("CUDA_DEVICE_ORDER", "PCI_BUS_ID")
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
@@ -41,15 +83,46 @@ AVAILABLE_OLLAMA_MODELS = []
 job_data = {}
 data_lock = threading.Lock()
 
-# SEMAPHORE pour limiter les jobs GPU à 1 à la fois
-gpu_semaphore = threading.Semaphore(1)
+# Un job à la fois par GPU : index des périphériques occupés
+gpu_busy = set()
+gpu_slots_lock = threading.Lock()
+
+# File des jobs GPU : ils attendent ici un GPU libre (local ou distant), sans occuper de
+# thread de l'executor ni de délai max (l'attente est bornée par le contrôle d'admission)
+gpu_queue = deque()
+gpu_queue_cond = threading.Condition()
+gpu_dispatcher = None
 
 # ===== INITIALISATION DE L'EXECUTEUR =====
-executor = ThreadPoolExecutor(max_workers=2)
+executor = ThreadPoolExecutor(max_workers=app.config['MAX_CONCURRENT_JOBS'])
+
+# Pool de processus pour l'extraction PDF (hors GIL du serveur), créé à la demande.
+# 'spawn' et non 'fork' : le pool est créé depuis un thread du serveur, un fils forké
+# hériterait des verrous tenus par les autres threads (import de torch, logs...).
+pdf_pool = None
+pdf_pool_lock = threading.Lock()
+
+def get_pdf_pool():
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is None:
+            pdf_pool = ProcessPoolExecutor(max_workers=app.config['PDF_WORKERS'],
+                                           mp_context=multiprocessing.get_context('spawn'))
+        return pdf_pool
+
+def discard_pdf_pool(pool):
+    """Abandonne un pool cassé (processus fils mort, ex: crash pdfium) ; le prochain appel en recrée un"""
+    global pdf_pool
+    with pdf_pool_lock:
+        if pdf_pool is pool:
+            pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
 
 def shutdown_executor():
     print("🛑 Stopping executor...")
     executor.shutdown(wait=True)
+    if pdf_pool is not None:
+        pdf_pool.shutdown(wait=True, cancel_futures=True)
 
 atexit.register(shutdown_executor)
 
@@ -57,9 +130,30 @@ atexit.register(shutdown_executor)
 # GESTION AVANCÉE DE LA MÉMOIRE
 # =======================================================================
 
-def get_gpu_memory_info():
-    """Retourne (free_mem_gb, total_mem_gb)"""
-    if HAS_TORCH and torch.cuda.is_available():
+def query_gpu_memory():
+    """Mémoire de tous les GPU en un seul appel nvidia-smi : {index: (free_gb, total_gb)}.
+
+    Pas de torch ici : mem_get_info créerait un contexte CUDA (et occuperait de la VRAM)
+    sur chaque GPU interrogé, dans le processus du serveur web.
+    """
+    try:
+        cmd = "nvidia-smi --query-gpu=index,memory.free,memory.total --format=csv,nounits,noheader"
+        result = subprocess.check_output(cmd, shell=True, stderr=subprocess.DEVNULL).decode().strip().splitlines()
+        memory = {}
+        for line in result:
+            index, free_mb, total_mb = line.split(',')
+            memory[int(index)] = (float(free_mb) / 1024, float(total_mb) / 1024)
+        return memory
+    except:
+        return {}
+
+def get_gpu_memory_info(device=None):
+    """Retourne (free_mem_gb, total_mem_gb) pour un GPU (None = périphérique par défaut)"""
+    if device is not None:
+        return query_gpu_memory().get(device, (0, 0))
+
+    torch = get_cuda_torch()
+    if torch:
         try:
             free, total = torch.cuda.mem_get_info()
             return free / 1024**3, total / 1024**3
@@ -69,14 +163,33 @@ def get_gpu_memory_info():
     # Fallback nvidia-smi
     try:
         cmd = "nvidia-smi --query-gpu=memory.free,memory.total --format=csv,nounits,noheader"
-        result = subprocess.check_output(cmd, shell=True).decode().strip()
+        result = subprocess.check_output(cmd, shell=True).decode().strip().splitlines()[0]
         free_mb, total_mb = map(float, result.split(','))
         return free_mb / 1024, total_mb / 1024
     except:
         return 0, 0
 
+# Jobs en cours de traduction : Ollama est partagé entre les GPU, on ne le décharge
+# pas pendant qu'un autre job s'en sert
+ollama_jobs = set()
+ollama_lock = threading.Lock()
+
+def set_ollama_in_use(job_id, in_use):
+    with ollama_lock:
+        if in_use:
+            ollama_jobs.add(job_id)
+        else:
+            ollama_jobs.discard(job_id)
+
 def force_unload_ollama(job_id=None):
-    """Décharge TOUS les modèles chargés dans Ollama"""
+    """Décharge TOUS les modèles chargés dans Ollama, sauf si un autre job traduit"""
+    with ollama_lock:
+        other_jobs = ollama_jobs - {job_id}
+    if other_jobs:
+        if job_id:
+            log_to_job(job_id, f"🧠 Ollama in use by {len(other_jobs)} other job(s), unload skipped", 'info')
+        return
+
     unloaded_count = 0
     try:
         running_models = []
@@ -110,18 +223,19 @@ def force_unload_ollama(job_id=None):
     except Exception as e:
         if job_id: log_to_job(job_id, f"⚠️ Unload error: {e}", 'warning')
 
-def wait_for_vram(required_gb=3.0, timeout=30, job_id=None):
+def wait_for_vram(required_gb=3.0, timeout=30, job_id=None, device=None):
     """Boucle d'attente active qui bloque tant que la VRAM n'est pas libre"""
     start_time = time.time()
     
     # Nettoyage immédiat
     force_unload_ollama(job_id)
     gc.collect()
-    if HAS_TORCH and torch.cuda.is_available():
+    torch = get_cuda_torch()
+    if torch:
         torch.cuda.empty_cache()
     
     while (time.time() - start_time) < timeout:
-        free_gb, total_gb = get_gpu_memory_info()
+        free_gb, total_gb = get_gpu_memory_info(device)
         
         if total_gb == 0: # Pas de GPU ou erreur détection
             return True
@@ -142,60 +256,378 @@ def wait_for_vram(required_gb=3.0, timeout=30, job_id=None):
 def cleanup_gpu_memory(job_id=None, aggressive=False):
     force_unload_ollama(job_id)
     gc.collect()
-    if HAS_TORCH and torch.cuda.is_available():
+    torch = get_cuda_torch()
+    if torch:
         torch.cuda.empty_cache()
     return True
 
 # =======================================================================
+# ORDONNANCEMENT GPU (MULTI-GPU & NŒUDS DISTANTS)
+# =======================================================================
+
+# GPU détectés, une seule fois (appelé plusieurs fois par upload pour l'admission)
+detected_gpu_devices = None
+
+def get_gpu_devices():
+    """Liste des index GPU utilisables (config, sinon nvidia-smi)"""
+    global detected_gpu_devices
+    if app.config['GPU_DEVICES'] is not None:
+        return list(app.config['GPU_DEVICES'])
+    if detected_gpu_devices is None:
+        # Aucun GPU détecté : un seul slot, comme le verrou historique
+        detected_gpu_devices = sorted(query_gpu_memory()) or [0]
+    return list(detected_gpu_devices)
 
-def run_yomitoku_job_with_lock(job_id, input_filenames, base_cmd, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format, gpu_lock):
-    """Wrapper pour exécuter le job avec verrou GPU et surveillance VRAM"""
-    if gpu_lock:
-        acquired = False
+def get_gpu_status():
+    """État de chaque GPU local : mémoire libre/totale et occupation (un seul appel nvidia-smi)"""
+    with gpu_slots_lock:
+        busy = set(gpu_busy)
+    memory = query_gpu_memory()
+    status = []
+    for device in get_gpu_devices():
+        free_gb, total_gb = memory.get(device, (0, 0))
+        status.append({'index': device, 'free_gb': free_gb, 'total_gb': total_gb, 'busy': device in busy})
+    return status
+
+def acquire_gpu_device():
+    """Réserve le GPU libre ayant le plus de mémoire disponible. Retourne son index ou None (tous occupés)"""
+    candidates = [d for d in get_gpu_status() if not d['busy']]
+    candidates.sort(key=lambda d: d['free_gb'], reverse=True)
+    with gpu_slots_lock:
+        for candidate in candidates:
+            if candidate['index'] not in gpu_busy:
+                gpu_busy.add(candidate['index'])
+                return candidate['index']
+    return None
+
+def release_gpu_device(device):
+    with gpu_slots_lock:
+        gpu_busy.discard(device)
+    # Réveille le dispatcher : le prochain job GPU peut démarrer
+    with gpu_queue_cond:
+        gpu_queue_cond.notify_all()
+
+def worker_headers():
+    token = app.config['WORKER_TOKEN']
+    return {'X-Worker-Token': token} if token else {}
+
+def select_gpu_node():
+    """Retourne l'URL du worker distant ayant un GPU libre avec le plus de mémoire,
+    ou None si un GPU local libre convient mieux (ou si aucun GPU distant n'est libre)"""
+    idle_local = [d['free_gb'] for d in get_gpu_status() if not d['busy']]
+    best_url, best_free = None, max(idle_local) if idle_local else -1
+    for url in app.config['REMOTE_WORKERS']:
         try:
-            acquired = gpu_lock.acquire(timeout=600)
-            if acquired:
-                log_to_job(job_id, "🔒 GPU Lock acquired (batch processing)", 'info')
-                
-                vram_ok = wait_for_vram(required_gb=3.0, timeout=45, job_id=job_id)
-                
-                if not vram_ok:
-                    free_gb, _ = get_gpu_memory_info()
-                    log_to_job(job_id, f"❌ CRITICAL ERROR: Insufficient VRAM ({free_gb:.2f}GB). Ollama is blocking.", 'error')
-                    with data_lock:
-                        job_data[job_id]['status'] = 'error'
-                    return
-
-                run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format)
-            else:
-                log_to_job(job_id, "❌ Timeout: Unable to acquire GPU lock", 'error')
+            response = requests.get(f"{url}/api/worker/status", headers=worker_headers(), timeout=3)
+            if response.status_code != 200:
+                continue
+            status = response.json()
+            # Jobs déjà en attente sur ce worker : ses GPU "libres" leur sont promis
+            if status.get('queued', 0) > 0:
+                continue
+            for device in status.get('devices', []):
+                if not device['busy'] and device['free_gb'] > best_free:
+                    best_url, best_free = url, device['free_gb']
+        except:
+            pass
+    return best_url
+
+def reserve_gpu_node(allow_remote):
+    """Réserve le meilleur GPU libre : (index local, None), (None, URL du worker) ou (None, None) si tout est occupé"""
+    if allow_remote and app.config['REMOTE_WORKERS']:
+        worker_url = select_gpu_node()
+        if worker_url:
+            return None, worker_url
+    return acquire_gpu_device(), None
+
+def submit_job(job_id, job_args, use_gpu, allow_remote=True):
+    """Lance un job : directement dans l'executor (CPU) ou via la file GPU.
+
+    job_args = arguments de run_yomitoku_job_with_lock après job_id. Retourne un Future
+    terminé à la fin du job.
+    """
+    global gpu_dispatcher
+    if not use_gpu:
+        return executor.submit(run_yomitoku_job_with_lock, job_id, *job_args)
+    future = Future()
+    with gpu_queue_cond:
+        gpu_queue.append((job_id, job_args, allow_remote, future))
+        if gpu_dispatcher is None:
+            gpu_dispatcher = threading.Thread(target=dispatch_gpu_jobs, name='gpu-dispatcher', daemon=True)
+            gpu_dispatcher.start()
+        gpu_queue_cond.notify_all()
+    return future
+
+def dispatch_gpu_jobs():
+    """Démarre les jobs GPU dans l'ordre d'arrivée, chacun dès qu'un GPU est réservé pour lui"""
+    waiting_job = None
+    while True:
+        with gpu_queue_cond:
+            while not gpu_queue:
+                gpu_queue_cond.wait()
+            job_id, job_args, allow_remote, future = gpu_queue[0]
+
+        if not get_gpu_devices() and not (allow_remote and app.config['REMOTE_WORKERS']):
+            with gpu_queue_cond:
+                gpu_queue.popleft()
+            log_to_job(job_id, "❌ No GPU on this node and no remote worker configured", 'error')
+            with data_lock:
+                job_data[job_id]['status'] = 'error'
+            future.set_result(None)
+            continue
+
+        device, worker_url = reserve_gpu_node(allow_remote)
+        if device is None and worker_url is None:
+            if waiting_job != job_id:
+                log_to_job(job_id, "⏳ All GPUs busy, waiting for a free device...", 'warning')
+                waiting_job = job_id
+            with gpu_queue_cond:
+                # Réveillé par release_gpu_device ; sinon on ré-interroge les workers distants
+                gpu_queue_cond.wait(timeout=2)
+            continue
+
+        with gpu_queue_cond:
+            gpu_queue.popleft()
+        started = executor.submit(run_yomitoku_job_with_lock, job_id, *job_args, gpu_device=device, worker_url=worker_url)
+        started.add_done_callback(lambda _, future=future: future.set_result(None))
+
+def run_remote_job(worker_url, job_id, job_args):
+    """Envoie le job à un worker distant et recopie ses logs/progression localement"""
+    log_to_job(job_id, f"🛰️ Dispatching job to remote worker {worker_url}", 'info')
+    try:
+        response = requests.post(f"{worker_url}/api/worker/jobs", json={'job_id': job_id, **job_args},
+                                 headers=worker_headers(), timeout=10)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+
+        since, pages_done = 0, 0
+        while True:
+            time.sleep(1)
+            response = requests.get(f"{worker_url}/api/worker/jobs/{job_id}", params={'since': since},
+                                    headers=worker_headers(), timeout=10)
+            data = response.json()
+            for log in data['logs']:
+                log_to_job(job_id, log['message'], log['level'])
+            since = data['next']
+            with data_lock:
+                job_data[job_id]['progress'] = data['progress']
+                job_data[job_id]['current_page'] = data['current_page']
+                job_data[job_id]['total_pages'] = data['total_pages']
+                job_data[job_id]['pages'] = data['pages']
+            # Pages terminées sur le worker : plus comptées dans l'attente estimée du front-end
+            mark_pages_done(job_id, len(data['pages']) - pages_done)
+            pages_done = len(data['pages'])
+            if data['status'] in ['complete', 'error']:
                 with data_lock:
-                    job_data[job_id]['status'] = 'error'
+                    job_data[job_id]['status'] = data['status']
+                return
+    except Exception as e:
+        log_to_job(job_id, f"❌ Remote worker error ({worker_url}): {e}", 'error')
+        with data_lock:
+            job_data[job_id]['status'] = 'error'
+
+# =======================================================================
+# CONTRÔLE D'ADMISSION (file d'attente bornée, quotas par session)
+# =======================================================================
+
+# Travail en attente/en cours : job_id -> {'session', 'device', 'pages', 'done'}
+queued_work = {}
+# Débit appris : clé périphérique ('cpu', 'cuda:0', ...) -> secondes par page (moyenne mobile)
+seconds_per_page = {}
+admission_lock = threading.Lock()
+
+def count_pages(path):
+    """Nombre de pages d'un fichier (PDF via pypdfium2, image = 1)"""
+    if Path(path).suffix.lower() != '.pdf':
+        return 1
+    try:
+        pdf = lazy_import('pypdfium2').PdfDocument(str(path))
+        try:
+            return len(pdf)
         finally:
-            if acquired:
-                log_to_job(job_id, "🏁 Job finished, cleaning up...", 'info')
-                force_unload_ollama(job_id)
-                gpu_lock.release()
-                log_to_job(job_id, "🔓 GPU lock released", 'info')
-    else:
-        run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format)
+            pdf.close()
+    except Exception:
+        return 1
+
+def record_throughput(device_key, pages, elapsed):
+    """Met à jour le débit appris du périphérique (moyenne mobile exponentielle)"""
+    if pages <= 0 or elapsed <= 0:
+        return
+    sample = elapsed / pages
+    with admission_lock:
+        previous = seconds_per_page.get(device_key)
+        seconds_per_page[device_key] = sample if previous is None else 0.7 * previous + 0.3 * sample
+
+def get_seconds_per_page(device):
+    """Débit estimé pour une classe de périphériques ('cuda' = moyenne des GPU appris)"""
+    with admission_lock:
+        learned = [v for k, v in seconds_per_page.items() if k.split(':')[0] == device]
+    if learned:
+        return sum(learned) / len(learned)
+    return app.config['DEFAULT_SECONDS_PER_PAGE'].get(device, app.config['DEFAULT_SECONDS_PER_PAGE']['cpu'])
+
+def admission_capacity(device):
+    """(secondes par page, nombre de jobs en parallèle) pour une classe de périphériques"""
+    parallel = app.config['MAX_CONCURRENT_JOBS']
+    if device == 'cuda':
+        # Un job par GPU, dans la limite des threads de l'executor (un job distant en occupe un aussi)
+        parallel = min(parallel, len(get_gpu_devices()) + len(app.config['REMOTE_WORKERS']))
+    return get_seconds_per_page(device), max(1, parallel)
+
+def estimate_wait(device, extra_pages=0):
+    """Attente estimée (s) pour le travail en file sur cette classe de périphériques"""
+    rate, parallel = admission_capacity(device)
+    with admission_lock:
+        pages = sum(w['pages'] - w['done'] for w in queued_work.values() if w['device'] == device)
+    return (pages + extra_pages) * rate / parallel
+
+def _admission_rejection(session_id, device, pages, rate, parallel):
+    """Décision d'admission, à appeler sous admission_lock.
+
+    Retourne None si le job est accepté, sinon (code HTTP, clé du message, retry_after, attente
+    estimée). retry_after vaut None quand réessayer ne servirait à rien (413).
+    """
+    queued_pages = sum(w['pages'] - w['done'] for w in queued_work.values() if w['device'] == device)
+    mine = [w for w in queued_work.values() if w['session'] == session_id]
+    my_pages = sum(w['pages'] - w['done'] for w in mine)
+    wait_before = queued_pages * rate / parallel
+    wait = (queued_pages + pages) * rate / parallel
+
+    # Le job seul dépasse le quota de session : il ne passera jamais
+    if pages > app.config['SESSION_MAX_PAGES']:
+        return 413, 'too_large', None, wait
+    if len(mine) >= app.config['SESSION_MAX_JOBS'] or my_pages + pages > app.config['SESSION_MAX_PAGES']:
+        return 429, 'quota', max(30, my_pages * rate / parallel), wait
+    if len(queued_work) >= app.config['MAX_QUEUED_JOBS']:
+        return 503, 'busy', max(30, wait_before), wait
+    # File vide : un gros job est accepté même si sa durée seule dépasse MAX_QUEUE_WAIT
+    if wait > app.config['MAX_QUEUE_WAIT'] and queued_pages > 0:
+        if pages * rate / parallel > app.config['MAX_QUEUE_WAIT']:
+            retry_after = wait_before              # Il faut attendre que la file se vide
+        else:
+            retry_after = wait - app.config['MAX_QUEUE_WAIT']
+        return 503, 'busy', max(30, retry_after), wait
+    return None
+
+def check_admission(session_id, device, pages):
+    """Vérifie sans réserver (refus rapide avant d'écrire les fichiers sur disque)"""
+    rate, parallel = admission_capacity(device)
+    with admission_lock:
+        return _admission_rejection(session_id, device, pages, rate, parallel)
+
+def admit_job(job_id, session_id, device, pages):
+    """Vérifie et enregistre le job en une seule étape. Retourne None si accepté, sinon le refus"""
+    rate, parallel = admission_capacity(device)
+    with admission_lock:
+        rejected = _admission_rejection(session_id, device, pages, rate, parallel)
+        if rejected is None:
+            queued_work[job_id] = {'session': session_id, 'device': device, 'pages': pages, 'done': 0}
+        return rejected
+
+def mark_pages_done(job_id, pages):
+    with admission_lock:
+        if job_id in queued_work:
+            queued_work[job_id]['done'] = min(queued_work[job_id]['pages'], queued_work[job_id]['done'] + pages)
+
+def release_job(job_id):
+    with admission_lock:
+        queued_work.pop(job_id, None)
+
+# =======================================================================
+# OPTIONS OCR (liste blanche, commune au front-end et aux workers)
+# =======================================================================
+
+OCR_FORMATS = ['md', 'html', 'json', 'csv', 'pdf']
+OCR_DEVICES = ['cpu', 'cuda']
+OCR_FLAGS = {
+    'vis': '-v', 'lite': '-l', 'figure': '--figure', 'figure_letter': '--figure_letter',
+    'ignore_line_break': '--ignore_line_break', 'combine': '--combine', 'ignore_meta': '--ignore_meta'
+}
+
+def parse_ocr_options(form):
+    """Options OCR structurées depuis le formulaire d'upload"""
+    options = {'format': form.get('format', 'md'), 'device': form.get('device', 'cpu')}
+    options.update({flag: flag in form for flag in OCR_FLAGS})
+    return options
+
+def build_yomitoku_cmd(options, job_path):
+    """Construit la commande yomitoku ; la sortie est toujours job_path/results. ValueError si option invalide"""
+    if options.get('format') not in OCR_FORMATS:
+        raise ValueError(f"Invalid format: {options.get('format')}")
+    if options.get('device') not in OCR_DEVICES:
+        raise ValueError(f"Invalid device: {options.get('device')}")
+    cmd = ['yomitoku', '-f', options['format'], '-o', str(job_path / 'results'), '-d', options['device']]
+    cmd.extend(arg for flag, arg in OCR_FLAGS.items() if options.get(flag) is True)
+    return cmd
+
+# =======================================================================
+
+def run_yomitoku_job_with_lock(job_id, input_filenames, ocr_options, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, gpu_device=None, worker_url=None):
+    """Exécute le job sur le GPU réservé par la file GPU (local ou distant) avec surveillance VRAM, ou sur CPU"""
+    with data_lock:
+        job_data.setdefault(job_id, new_job_entry())['status'] = 'running'
+    try:
+        base_cmd = build_yomitoku_cmd(ocr_options, job_path)
+        output_format = ocr_options['format']
+        if worker_url:
+            run_remote_job(worker_url, job_id, {
+                'input_filenames': input_filenames, 'ocr_options': ocr_options,
+                'translate_enabled': translate_enabled, 'target_lang': target_lang,
+                'ollama_model': ollama_model, 'custom_prompt': custom_prompt,
+                'num_ctx': num_ctx
+            })
+        elif gpu_device is not None:
+            log_to_job(job_id, f"🔒 GPU {gpu_device} acquired (batch processing)", 'info')
+
+            vram_ok = wait_for_vram(required_gb=3.0, timeout=45, job_id=job_id, device=gpu_device)
+
+            if not vram_ok:
+                free_gb, _ = get_gpu_memory_info(gpu_device)
+                log_to_job(job_id, f"❌ CRITICAL ERROR: Insufficient VRAM on GPU {gpu_device} ({free_gb:.2f}GB). Ollama is blocking.", 'error')
+                with data_lock:
+                    job_data[job_id]['status'] = 'error'
+                return
+
+            run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format, gpu_device=gpu_device)
+        else:
+            run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format)
+    finally:
+        if gpu_device is not None:
+            log_to_job(job_id, "🏁 Job finished, cleaning up...", 'info')
+            force_unload_ollama(job_id)
+            release_gpu_device(gpu_device)
+            log_to_job(job_id, f"🔓 GPU {gpu_device} released", 'info')
+
+def new_job_entry(status='running'):
+    return {
+        'logs': deque(maxlen=1000),
+        'log_count': 0,
+        'progress': 0,
+        'status': status,
+        'current_page': None,
+        'total_pages': None,
+        'pages': [],
+        'combine': False
+    }
+
+def register_queued_job(job_id, ocr_options):
+    """Crée l'entrée du job dès l'acceptation : il reste 'queued' jusqu'au démarrage dans l'executor"""
+    with data_lock:
+        job_data[job_id] = new_job_entry('queued')
+        # --combine : yomitoku n'écrit que le fichier fusionné, à la fin (pas de résultats partiels)
+        job_data[job_id]['combine'] = ocr_options.get('combine') is True
 
 def log_to_job(job_id, message, level='info', progress=None):
     with data_lock:
         if job_id not in job_data or 'logs' not in job_data[job_id]:
-            job_data[job_id] = {
-                'logs': deque(maxlen=1000),
-                'progress': 0,
-                'status': 'running',
-                'current_page': None,
-                'total_pages': None
-            }
+            job_data[job_id] = new_job_entry()
         
         job_data[job_id]['logs'].append({
             'timestamp': time.time(),
             'message': message,
             'level': level
         })
+        job_data[job_id]['log_count'] += 1
         
         if progress is not None:
             job_data[job_id]['progress'] = progress
@@ -217,9 +649,11 @@ def detect_ollama_models():
         print("❌ Ollama is not accessible")
     return False
 
-# Démarrage
-print(f"🚀 STARTING YOMITOKU + OLLAMA SERVER")
-detect_ollama_models()
+# Démarrage : détection Ollama et GPU en arrière-plan (pas dans les processus fils du pool PDF)
+if multiprocessing.current_process().name == 'MainProcess':
+    print(f"🚀 STARTING YOMITOKU + OLLAMA SERVER")
+    threading.Thread(target=detect_ollama_models, name='ollama-probe', daemon=True).start()
+    threading.Thread(target=get_gpu_devices, name='gpu-probe', daemon=True).start()
 
 # TRADUCTIONS (Interface Utilisateur uniquement)
 TRANSLATIONS = {
@@ -262,7 +696,8 @@ TRANSLATIONS = {
         'variables': 'Variables',
         'p_default': 'Défaut', 'p_manga': 'Manga', 'p_game': 'Jeux vidéo',
         'p_famitsu': 'Famitsu', 'p_tech': 'Technique', 'p_admin': 'Administratif',
-        'please_wait': 'Veuillez patienter'
+        'please_wait': 'Veuillez patienter', 'pages_ready': 'Pages déjà disponibles',
+        'combine_no_partial': 'Mode « Fusionner les pages » : le fichier de résultat sera disponible à la fin de l\'analyse.'
     },
     'en': {
         'title': 'Yomitoku + Ollama', 'subtitle': 'Document Analysis & Translation',
@@ -303,7 +738,8 @@ TRANSLATIONS = {
         'variables': 'Variables',
         'p_default': 'Default', 'p_manga': 'Manga', 'p_game': 'Video Games',
         'p_famitsu': 'Famitsu', 'p_tech': 'Technical', 'p_admin': 'Administrative',
-        'please_wait': 'Please wait'        
+        'please_wait': 'Please wait', 'pages_ready': 'Pages already available',
+        'combine_no_partial': '"Merge pages" mode: the result file will be available when the analysis finishes.'
     },
     'ja': {
         'title': 'Yomitoku + Ollama', 'subtitle': '文書分析 & 翻訳',
@@ -343,7 +779,8 @@ TRANSLATIONS = {
         'variables': '変数',
         'p_default': 'デフォルト', 'p_manga': 'マンガ', 'p_game': 'ビデオゲーム',
         'p_famitsu': 'ファミ通', 'p_tech': '技術書', 'p_admin': '行政文書',
-        'please_wait': 'お待ちください'
+        'please_wait': 'お待ちください', 'pages_ready': '処理済みのページ',
+        'combine_no_partial': '「ページを結合」モード：結果ファイルは分析完了後に利用できます。'
     }
 }
 
@@ -358,10 +795,14 @@ def get_job_path(job_id):
 def get_lang():
     return session.get('lang', 'fr')
 
-def translate_with_ollama(text, target_lang='fr', model=None, custom_prompt=None, num_ctx=4096, job_id=None, output_format='md'):
-    """Traduit avec Ollama en surveillant la VRAM"""
+def translate_with_ollama(text, target_lang='fr', model=None, custom_prompt=None, num_ctx=4096, job_id=None, output_format='md', manage_vram=True):
+    """Traduit avec Ollama en surveillant la VRAM.
+
+    manage_vram=False : ni attente VRAM ni déchargement du modèle (l'appelant le fait une
+    seule fois pour une série d'appels, ex: un PDF traduit page par page).
+    """
     
-    if not wait_for_vram(required_gb=4.0, timeout=20, job_id=job_id):
+    if manage_vram and not wait_for_vram(required_gb=4.0, timeout=20, job_id=job_id):
          log_to_job(job_id, "⚠️ Low VRAM before translation, risk of failure...", 'warning')
 
     # Dictionnaire des formats pour le prompt
@@ -433,9 +874,300 @@ Return ONLY the translated text."""
         log_to_job(job_id, f"❌ Exception: {str(e)}", 'error')
         return f"❌ Translation error: {str(e)}"
     finally:
+        if manage_vram:
+            force_unload_ollama(job_id)
+
+# =======================================================================
+# EXTRACTION PDF (PROCESSUS FILS) & RENDU PAR PAGE
+# =======================================================================
+
+def _pdf_page_count(pdf_path):
+    """Exécuté dans un processus fils : retourne le nombre de pages"""
+    pdf = lazy_import('pypdfium2').PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def _pdf_extract_range(pdf_path, start, stop):
+    """Exécuté dans un processus fils : extrait le texte des pages [start, stop)"""
+    pdf = lazy_import('pypdfium2').PdfDocument(pdf_path)
+    texts = []
+    try:
+        for index in range(start, stop):
+            page = pdf[index]
+            text_page = page.get_textpage()
+            texts.append(text_page.get_text_range())
+            text_page.close()
+            page.close()
+    finally:
+        pdf.close()
+    return texts
+
+def pdf_page_count(pdf_path):
+    """Nombre de pages du PDF, lu dans le pool de processus"""
+    for attempt in range(2):
+        pool = get_pdf_pool()
+        try:
+            return pool.submit(_pdf_page_count, str(pdf_path)).result()
+        except BrokenProcessPool:
+            # Pool cassé (par ce fichier ou un précédent) : on le remplace et on réessaie une fois
+            discard_pdf_pool(pool)
+            if attempt:
+                raise
+
+def iter_pdf_pages(pdf_path, total):
+    """Génère (numéro de page, texte) dans l'ordre, avec un nombre borné de lots en cours"""
+    pdf_path = str(pdf_path)
+    pool = get_pdf_pool()
+    step = max(1, app.config['PDF_PAGES_PER_TASK'])
+    starts = iter(range(0, total, step))
+    pending = deque()
+
+    def submit_next():
+        start = next(starts, None)
+        if start is not None:
+            pending.append(pool.submit(_pdf_extract_range, pdf_path, start, min(start + step, total)))
+
+    page_no = 0
+    try:
+        for _ in range(app.config['PDF_WORKERS'] * 2):
+            submit_next()
+
+        while pending:
+            texts = pending.popleft().result()
+            submit_next()
+            for text in texts:
+                page_no += 1
+                yield page_no, text
+    except BrokenProcessPool:
+        # Ce fichier a tué un processus fils : le fichier échoue, les suivants auront un pool neuf
+        discard_pdf_pool(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+def render_html_header(doc_title, source_name, target_lang, total_pages):
+    """En-tête HTML avec sommaire des pages (ancres #page-N)"""
+    nav = ''.join(f'<a href="#page-{n}">{n}</a>' for n in range(1, total_pages + 1))
+    return f"""<!DOCTYPE html>
+<html lang="{target_lang}">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{html.escape(doc_title)}: {html.escape(source_name)}</title>
+<style>
+    body {{ font-family: sans-serif; line-height: 1.6; padding: 20px; max-width: 900px; margin: auto; background: #f4f4f9; }}
+    nav {{ margin-bottom: 20px; }}
+    nav a {{ display: inline-block; margin: 0 6px 6px 0; padding: 2px 8px; background: white; border-radius: 4px; text-decoration: none; }}
+    .page {{ background: white; padding: 40px; margin-bottom: 20px; border-radius: 8px; box-shadow: 0 4px 10px rgba(0,0,0,0.1); }}
+    .page h2 {{ margin-top: 0; font-size: 1em; color: #888; }}
+    .content {{ white-space: pre-wrap; }}
+    .untranslated .content {{ color: #a94442; }}
+</style>
+</head>
+<body>
+<nav>{nav}</nav>
+"""
+
+def render_html_page(page_no, text, translated=True):
+    """Section HTML d'une page, ancrée sur #page-N"""
+    css = 'page' if translated else 'page untranslated'
+    return f"""<section class="{css}" id="page-{page_no}">
+    <h2>Page {page_no}</h2>
+    <div class="content">{html.escape(text)}</div>
+</section>
+"""
+
+HTML_FOOTER = """</body>
+</html>"""
+
+# Police CID (japonais) : langues CJK et pages non traduites, qui gardent le texte source
+CJK_PDF_FONT = 'HeiseiKakuGo-W5'
+
+def open_translated_pdf(pdf_path, doc_title, target_lang):
+    """Ouvre un canvas reportlab ; la police CID est utilisée pour les langues CJK"""
+    from reportlab.pdfgen import canvas as pdf_canvas
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+
+    pdf = pdf_canvas.Canvas(str(pdf_path), pagesize=A4)
+    pdf.setTitle(doc_title)
+    pdfmetrics.registerFont(UnicodeCIDFont(CJK_PDF_FONT))
+    font_name = CJK_PDF_FONT if target_lang in ('ja', 'zh', 'ko') else 'Helvetica'
+    return pdf, font_name
+
+def wrap_pdf_text(paragraph, font_name, font_size, max_width):
+    """Découpe une ligne à la largeur disponible : au dernier espace si possible,
+    sinon au caractère (le texte CJK n'a pas d'espaces)"""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    lines, line = [], ''
+    for char in paragraph:
+        if not line or stringWidth(line + char, font_name, font_size) <= max_width:
+            line += char
+            continue
+        cut = line.rfind(' ')
+        if char == ' ':
+            lines.append(line)
+            line = ''
+        elif cut > 0:
+            lines.append(line[:cut])
+            line = line[cut + 1:] + char
+        else:
+            lines.append(line)
+            line = char
+    lines.append(line)
+    return lines
+
+def render_pdf_page(pdf, font_name, page_no, text):
+    """Écrit une page source (éventuellement sur plusieurs pages PDF) avec signet"""
+    from reportlab.lib.pagesizes import A4
+
+    width, height = A4
+    margin, font_size = 50, 10
+    leading = font_size * 1.4
+
+    key = f"page-{page_no}"
+    pdf.bookmarkPage(key)
+    pdf.addOutlineEntry(f"Page {page_no}", key, level=0)
+    pdf.setFont(font_name, font_size + 2)
+    pdf.drawString(margin, height - margin, f"Page {page_no}")
+    y = height - margin - leading * 2
+    pdf.setFont(font_name, font_size)
+
+    for paragraph in text.splitlines() or ['']:
+        for line in wrap_pdf_text(paragraph, font_name, font_size, width - 2 * margin):
+            if y < margin:
+                pdf.showPage()
+                pdf.setFont(font_name, font_size)
+                y = height - margin
+            pdf.drawString(margin, y, line)
+            y -= leading
+    pdf.showPage()
+
+def translate_pdf_file(file_path, results_dir, target_lang, ollama_model, custom_prompt, num_ctx, job_id, output_format):
+    """Traduit un PDF page par page et écrit le HTML (et le PDF) au fil de l'eau"""
+    titles_map = {
+        'fr': 'Traduction', 'en': 'Translation', 'ja': '翻訳',
+        'es': 'Traducción', 'de': 'Übersetzung'
+    }
+    doc_title = titles_map.get(target_lang, 'Translation')
+
+    html_file = results_dir / f"translated_{target_lang}_{file_path.name}.html"
+    pdf_file = results_dir / f"translated_{target_lang}_{file_path.name}"
+    # Écriture hors de results/ puis renommage : un échec ne laisse pas de fichier "traduit"
+    # vide ou partiel, et n'écrase pas une traduction précédente
+    html_tmp = results_dir.parent / f"{html_file.name}.part"
+    pdf_tmp = results_dir.parent / f"{pdf_file.name}.part"
+    pdf_out, pdf_font = None, None
+    pages_done, pages_untranslated = 0, 0
+
+    total = pdf_page_count(file_path)
+
+    # Une seule attente VRAM / un seul déchargement pour tout le fichier (pas à chaque page)
+    if not wait_for_vram(required_gb=4.0, timeout=20, job_id=job_id):
+        log_to_job(job_id, "⚠️ Low VRAM before translation, risk of failure...", 'warning')
+
+    try:
+        with html_tmp.open('w', encoding='utf-8') as out:
+            out.write(render_html_header(doc_title, file_path.name, target_lang, total))
+            if total and app.config['TRANSLATED_PDF'] and lazy_import('reportlab'):
+                pdf_out, pdf_font = open_translated_pdf(pdf_tmp, f"{doc_title}: {file_path.name}", target_lang)
+
+            for page_no, text in iter_pdf_pages(file_path, total):
+                # Page vide : section vide quand même, pour que l'ancre du sommaire existe
+                if not text.strip():
+                    out.write(render_html_page(page_no, ''))
+                    if pdf_out is not None:
+                        render_pdf_page(pdf_out, pdf_font, page_no, '')
+                    continue
+
+                log_to_job(job_id, f"📄 [{file_path.name}] Translating page {page_no}/{total}", 'info')
+                translated = translate_with_ollama(text, target_lang, ollama_model, custom_prompt, num_ctx, job_id, output_format, manage_vram=False)
+                ok = bool(translated) and not translated.startswith('❌')
+                if not ok:
+                    log_to_job(job_id, f"⚠️ Page {page_no} kept untranslated", 'warning')
+                    pages_untranslated += 1
+
+                page_text = translated if ok else text
+                out.write(render_html_page(page_no, page_text, translated=ok))
+                if pdf_out is not None:
+                    # Page non traduite : texte source japonais, illisible en Helvetica
+                    render_pdf_page(pdf_out, pdf_font if ok else CJK_PDF_FONT, page_no, page_text)
+                if ok:
+                    pages_done += 1
+
+            out.write(HTML_FOOTER)
+
+        if pdf_out is not None:
+            pdf_out.save()
+            os.replace(pdf_tmp, pdf_file)
+        os.replace(html_tmp, html_file)
+    finally:
+        html_tmp.unlink(missing_ok=True)
+        pdf_tmp.unlink(missing_ok=True)
         force_unload_ollama(job_id)
 
-def run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format):
+    log_to_job(job_id, f"✅ Translated {pages_done} page(s) (Saved as HTML): {html_file.name}", 'success')
+    if pages_untranslated:
+        log_to_job(job_id, f"⚠️ {pages_untranslated} page(s) kept untranslated in {html_file.name}", 'warning')
+    if pdf_out is not None:
+        log_to_job(job_id, f"✅ Translated PDF: {pdf_file.name}", 'success')
+
+# =======================================================================
+# CANAL DE PROGRESSION OCR (événements JSON par page)
+# =======================================================================
+
+OCR_RUNNER = Path(__file__).resolve().parent / 'yomitoku_progress.py'
+
+def open_progress_channel(env):
+    """Crée le pipe de progression. Retourne (lecteur, extrémité écriture à fermer, options Popen)"""
+    read_fd, write_fd = os.pipe()
+    if os.name == 'nt':
+        import msvcrt
+        handle = msvcrt.get_osfhandle(write_fd)
+        os.set_handle_inheritable(handle, True)
+        env['YOMITOKU_PROGRESS_HANDLE'] = str(handle)
+        popen_kwargs = {'startupinfo': subprocess.STARTUPINFO(lpAttributeList={'handle_list': [handle]})}
+    else:
+        env['YOMITOKU_PROGRESS_FD'] = str(write_fd)
+        popen_kwargs = {'pass_fds': (write_fd,)}
+    return os.fdopen(read_fd, 'r', encoding='utf-8'), write_fd, popen_kwargs
+
+def consume_progress(job_id, reader, filename, file_idx, total_files, device_key, pages_seen):
+    """Lit les événements du sous-processus et met à jour job_data page par page"""
+    with reader:
+        for line in reader:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+
+            if event['event'] == 'document':
+                with data_lock:
+                    job_data[job_id]['current_page'] = 0
+                    job_data[job_id]['total_pages'] = event['total_pages']
+                log_to_job(job_id, f"📑 [{filename}] {event['total_pages']} page(s) to analyze", 'info')
+
+            elif event['event'] == 'page':
+                page, total = event['page'], max(event['total_pages'], 1)
+                pages_seen.append(page)
+                with data_lock:
+                    job_data[job_id]['current_page'] = page
+                    job_data[job_id]['total_pages'] = event['total_pages']
+                    job_data[job_id]['pages'].append({
+                        'file': filename, 'page': page, 'total_pages': event['total_pages'],
+                        'seconds': event['seconds'], 'files': event['files']
+                    })
+                global_progress = ((file_idx + page / total) / total_files) * 100
+                log_to_job(job_id, f"📄 [{filename}] Page {page}/{event['total_pages']} done ({event['seconds']:.1f}s)", 'info', global_progress)
+                record_throughput(device_key, 1, event['seconds'])
+                mark_pages_done(job_id, 1)
+
+def run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format, gpu_device=None):
     """Exécute Yomitoku SÉQUENTIELLEMENT pour chaque fichier"""
     process = None
     try:
@@ -445,50 +1177,62 @@ def run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, targe
         # Variable d'environnement
         my_env = os.environ.copy()
         my_env["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
+        if gpu_device is not None:
+            # Le sous-processus ne voit que son GPU (cuda:0 = GPU réservé)
+            my_env["CUDA_VISIBLE_DEVICES"] = str(gpu_device)
         
+        device_key = f"cuda:{gpu_device}" if gpu_device is not None else base_cmd[base_cmd.index('-d') + 1]
+
         for file_idx, filename in enumerate(input_filenames):
             input_path = job_path / filename
             log_to_job(job_id, f"⏳ Processing file {file_idx + 1}/{total_files}: {filename}", 'info')
             
-            # Construction de la commande pour CE fichier
-            current_cmd = list(base_cmd)
-            current_cmd.insert(1, str(input_path))
+            # Construction de la commande pour CE fichier (CLI yomitoku + canal de progression)
+            current_cmd = [sys.executable, str(OCR_RUNNER), str(input_path)] + list(base_cmd[1:])
+            file_pages = count_pages(input_path)
+            file_start = time.time()
             
-            process = subprocess.Popen(
-                current_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                universal_newlines=True, bufsize=1, env=my_env
+            progress_reader, progress_write_fd, popen_kwargs = open_progress_channel(my_env)
+            try:
+                process = subprocess.Popen(
+                    current_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    universal_newlines=True, bufsize=1, env=my_env, **popen_kwargs
+                )
+            except Exception:
+                progress_reader.close()
+                raise
+            finally:
+                os.close(progress_write_fd)
+
+            pages_seen = []
+            progress_thread = threading.Thread(
+                target=consume_progress,
+                args=(job_id, progress_reader, filename, file_idx, total_files, device_key, pages_seen),
+                daemon=True
             )
+            progress_thread.start()
             
-            # Lecture des logs
+            # Lecture des logs (texte brut, la progression passe par le canal dédié)
             for line in iter(process.stdout.readline, ''):
-                if line:
-                    line = line.strip()
-                    if 'Processing page' in line:
-                        parts = line.split()
-                        try:
-                            current = int(parts[2].split('/')[0])
-                            total = int(parts[2].split('/')[1])
-                            # Calcul progression globale (pourcentage de fichier + pourcentage de page)
-                            file_progress = (current / total)
-                            global_progress = ((file_idx + file_progress) / total_files) * 100
-                            
-                            log_to_job(job_id, f"[{filename}] {line}", 'info', global_progress)
-                        except:
-                            log_to_job(job_id, line, 'info')
-                    else:
-                        log_to_job(job_id, f"[{filename}] {line}", 'info')
+                if line.strip():
+                    log_to_job(job_id, f"[{filename}] {line.strip()}", 'info')
             
             returncode = process.wait()
             process.stdout.close()
+            progress_thread.join(timeout=10)
             
             if returncode != 0:
                 log_to_job(job_id, f"❌ Error on file {filename} (code {returncode})", 'error')
                 # On continue quand même les autres fichiers
+            elif not pages_seen:
+                record_throughput(device_key, file_pages, time.time() - file_start)
+            mark_pages_done(job_id, file_pages - len(pages_seen))
         
         log_to_job(job_id, "✅ All files processed", 'success')
         
         # TRADUCTION
         if translate_enabled:
+            set_ollama_in_use(job_id, True)
             log_to_job(job_id, f"\n🌐 TRANSLATION to {target_lang} (Ctx: {num_ctx})", 'info')
             results_dir = job_path / 'results'
             files_to_translate = []
@@ -504,71 +1248,25 @@ def run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, targe
                 log_to_job(job_id, f"📝 Translating ({i+1}/{len(files_to_translate)}): {file_path.name}", 'info')
                 
                 try:
-                    text = ""
-                    is_pdf_source = (file_path.suffix.lower() == '.pdf')
-
-                    # 1. Extraction du texte
-                    if is_pdf_source:
+                    # CAS SPÉCIAL : Source PDF -> extraction par page en processus fils, sortie HTML (+ PDF)
+                    if file_path.suffix.lower() == '.pdf':
                         try:
-                            pdf = pdfium.PdfDocument(str(file_path))
-                            text_pages = []
-                            for page in pdf:
-                                text_page = page.get_textpage()
-                                text_pages.append(text_page.get_text_range())
-                                text_page.close()
-                            text = "\n\n".join(text_pages)
-                            pdf.close()
+                            translate_pdf_file(file_path, results_dir, target_lang, ollama_model, custom_prompt, num_ctx, job_id, output_format)
                         except Exception as pdf_err:
-                            log_to_job(job_id, f"⚠️ PDF Read Error: {pdf_err}", 'warning')
-                            continue
-                    else:
-                        text = file_path.read_text(encoding='utf-8', errors='replace')
+                            log_to_job(job_id, f"❌ PDF translation error ({file_path.name}): {pdf_err}", 'error')
+                        continue
 
+                    # CAS STANDARD (Markdown, JSON, etc.)
+                    text = file_path.read_text(encoding='utf-8', errors='replace')
                     if not text.strip(): continue
 
-                    # 2. Envoi à Ollama
                     translated = translate_with_ollama(text, target_lang, ollama_model, custom_prompt, num_ctx, job_id, output_format)
                     
                     if translated and not translated.startswith('❌'):
-                        
-                        # 3. Sauvegarde
-                        if is_pdf_source:
-                            # CAS SPÉCIAL : Source PDF -> Sortie HTML
-                            new_name = f"translated_{target_lang}_{file_path.name}.html"
-                            translated_file = results_dir / new_name
-                            
-                            # Traduction du titre du document HTML
-                            titles_map = {
-                                'fr': 'Traduction', 'en': 'Translation', 'ja': '翻訳', 
-                                'es': 'Traducción', 'de': 'Übersetzung'
-                            }
-                            doc_title = titles_map.get(target_lang, 'Translation')
-                            
-                            # Template HTML simple pour un rendu propre
-                            html_content = f"""<!DOCTYPE html>
-<html lang="{target_lang}">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>{doc_title}: {file_path.name}</title>
-<style>
-    body {{ font-family: sans-serif; line-height: 1.6; padding: 20px; max-width: 900px; margin: auto; background: #f4f4f9; }}
-    .content {{ background: white; padding: 40px; border-radius: 8px; box-shadow: 0 4px 10px rgba(0,0,0,0.1); white-space: pre-wrap; }}
-</style>
-</head>
-<body>
-    <div class="content">{translated}</div>
-</body>
-</html>"""
-                            translated_file.write_text(html_content, encoding='utf-8')
-                            log_to_job(job_id, f"✅ Translated (Saved as HTML): {translated_file.name}", 'success')
-                        
-                        else:
-                            # CAS STANDARD (Markdown, JSON, etc.)
-                            new_name = f"translated_{target_lang}_{file_path.name}"
-                            translated_file = results_dir / new_name
-                            translated_file.write_text(translated, encoding='utf-8')
-                            log_to_job(job_id, f"✅ Translated: {translated_file.name}", 'success')
+                        new_name = f"translated_{target_lang}_{file_path.name}"
+                        translated_file = results_dir / new_name
+                        translated_file.write_text(translated, encoding='utf-8')
+                        log_to_job(job_id, f"✅ Translated: {translated_file.name}", 'success')
                             
                 except Exception as e:
                     log_to_job(job_id, f"❌ File error: {e}", 'error')
@@ -584,11 +1282,13 @@ def run_yomitoku_job(job_id, input_filenames, base_cmd, translate_enabled, targe
         if process and process.poll() is None:
             try: process.kill()
             except: pass
+        set_ollama_in_use(job_id, False)
         force_unload_ollama(job_id)
 
 @app.route('/')
 def index():
     lang = get_lang()
+    # Pas d'attente d'Ollama : la page charge la liste des modèles via /api/ollama/models
     return render_template('index.html', lang=lang, translations=TRANSLATIONS[lang], ollama_models=AVAILABLE_OLLAMA_MODELS)
 
 @app.route('/set_lang/<lang>')
@@ -621,6 +1321,7 @@ def stream_logs(job_id):
             yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
             return
         last_log_count = 0
+        last_page_count = 0
         last_progress = 0
         while True:
             with data_lock:
@@ -629,6 +1330,10 @@ def stream_logs(job_id):
                 progress = data.get('progress', 0)
                 status = data.get('status', 'running')
                 cp, tp = data.get('current_page'), data.get('total_pages')
+                pages = list(data.get('pages', []))
+            if len(pages) > last_page_count:
+                for page in pages[last_page_count:]: yield f"data: {json.dumps({'type': 'page', 'page': page})}\n\n"
+                last_page_count = len(pages)
             if len(logs) > last_log_count:
                 for log in logs[last_log_count:]: yield f"data: {json.dumps({'type': 'log', 'log': log})}\n\n"
                 last_log_count = len(logs)
@@ -646,9 +1351,18 @@ def upload_file():
     # Gestion des messages d'erreur traduits
     lang = session.get('lang', 'fr')
     err_msgs = {
-        'fr': {'no_file': 'Aucun fichier fourni', 'empty': 'Aucun fichier sélectionné', 'invalid': 'Aucun fichier valide'},
-        'en': {'no_file': 'No file provided', 'empty': 'No file selected', 'invalid': 'No valid files'},
-        'ja': {'no_file': 'ファイルがありません', 'empty': 'ファイルが選択されていません', 'invalid': '有効なファイルがありません'}
+        'fr': {'no_file': 'Aucun fichier fourni', 'empty': 'Aucun fichier sélectionné', 'invalid': 'Aucun fichier valide',
+               'busy': 'Serveur saturé, réessayez dans {minutes} min (attente estimée : {wait} min)',
+               'quota': 'Trop d\'analyses en attente pour votre session, réessayez dans {minutes} min',
+               'too_large': 'Document trop volumineux : {pages} pages (maximum {max_pages} par session)'},
+        'en': {'no_file': 'No file provided', 'empty': 'No file selected', 'invalid': 'No valid files',
+               'busy': 'Server is busy, retry in {minutes} min (estimated wait: {wait} min)',
+               'quota': 'Too many queued analyses for your session, retry in {minutes} min',
+               'too_large': 'Document too large: {pages} pages (maximum {max_pages} per session)'},
+        'ja': {'no_file': 'ファイルがありません', 'empty': 'ファイルが選択されていません', 'invalid': '有効なファイルがありません',
+               'busy': 'サーバーが混雑しています。{minutes}分後に再試行してください（推定待ち時間：{wait}分）',
+               'quota': 'このセッションの待機中の分析が多すぎます。{minutes}分後に再試行してください',
+               'too_large': '文書が大きすぎます：{pages}ページ（セッションごとの上限は{max_pages}ページ）'}
     }
     msgs = err_msgs.get(lang, err_msgs['en'])
 
@@ -656,6 +1370,19 @@ def upload_file():
     
     files = request.files.getlist('file')
     if not files or files[0].filename == '': return jsonify({'error': msgs['empty']}), 400
+
+    session_id = session.setdefault('sid', uuid.uuid4().hex)
+    ocr_options = parse_ocr_options(request.form)
+    device = ocr_options['device']
+    try:
+        build_yomitoku_cmd(ocr_options, Path('.'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Refus immédiat (avant écriture disque) si la session ou la file est déjà pleine
+    rejected = check_admission(session_id, device, 0)
+    if rejected:
+        return admission_error(rejected, msgs)
     
     job_id = str(uuid.uuid4())[:8]
     job_path = get_job_path(job_id)
@@ -669,10 +1396,16 @@ def upload_file():
             valid_filenames.append(filename)
     
     if not valid_filenames:
+        shutil.rmtree(job_path, ignore_errors=True)
         return jsonify({'error': msgs['invalid']}), 400
+
+    pages = sum(count_pages(job_path / f) for f in valid_filenames)
+    estimated_wait = estimate_wait(device)
+    rejected = admit_job(job_id, session_id, device, pages)
+    if rejected:
+        shutil.rmtree(job_path, ignore_errors=True)
+        return admission_error(rejected, msgs, pages)
     
-    output_format = request.form.get('format', 'md')
-    device = request.form.get('device', 'cpu')
     translate_enabled = 'translate' in request.form
     target_lang = request.form.get('target_lang', 'fr')
     ollama_model = request.form.get('ollama_model', app.config['OLLAMA_MODEL'])
@@ -684,20 +1417,24 @@ def upload_file():
     except ValueError:
         num_ctx = 4096
 
-    base_cmd = ['yomitoku', '-f', output_format, '-o', str(job_path / 'results'), '-d', device]
-    if 'vis' in request.form: base_cmd.append('-v')
-    if 'lite' in request.form: base_cmd.append('-l')
-    if 'figure' in request.form: base_cmd.append('--figure')
-    if 'figure_letter' in request.form: base_cmd.append('--figure_letter')
-    if 'ignore_line_break' in request.form: base_cmd.append('--ignore_line_break')
-    if 'combine' in request.form: base_cmd.append('--combine')
-    if 'ignore_meta' in request.form: base_cmd.append('--ignore_meta')
-    
-    gpu_lock = gpu_semaphore if device == 'cuda' else None
-    executor.submit(run_yomitoku_job_with_lock, job_id, valid_filenames, base_cmd, translate_enabled, 
-                   target_lang, ollama_model, custom_prompt, num_ctx, job_path, output_format, gpu_lock)
+    register_queued_job(job_id, ocr_options)
+    future = submit_job(job_id, (valid_filenames, ocr_options, translate_enabled, target_lang, ollama_model,
+                                 custom_prompt, num_ctx, job_path), device == 'cuda')
+    future.add_done_callback(lambda _: release_job(job_id))
     
-    return jsonify({'job_id': job_id, 'success': True, 'files': []})
+    return jsonify({'job_id': job_id, 'success': True, 'files': [], 'pages': pages, 'estimated_wait': round(estimated_wait)})
+
+def admission_error(rejected, msgs, pages=0):
+    """Réponse 413/429/503 avec attente estimée (et Retry-After si réessayer a un sens)"""
+    code, key, retry_after, wait = rejected
+    if retry_after is None:
+        message = msgs[key].format(pages=pages, max_pages=app.config['SESSION_MAX_PAGES'])
+        return jsonify({'error': message, 'estimated_wait': round(wait)}), code
+    retry_after = int(retry_after)
+    message = msgs[key].format(minutes=max(1, round(retry_after / 60)), wait=max(1, round(wait / 60)))
+    response = jsonify({'error': message, 'retry_after': retry_after, 'estimated_wait': round(wait)})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, code
 
 @app.route('/download/<job_id>/<filename>')
 def download_file(job_id, filename):
@@ -721,14 +1458,16 @@ def view_file(job_id, filename):
 @app.route('/results/<job_id>')
 def view_results(job_id):
     rd = get_job_path(job_id) / 'results'
-    if not rd.exists(): return "Results not found", 404
+    state = get_job_state(job_id)
+    # Un job en cours peut ne pas encore avoir de dossier results/
+    if not rd.exists() and state['status'] not in ['queued', 'running']: return "Results not found", 404
     files, vis, trans = [], [], []
-    for f in rd.iterdir():
+    for f in (rd.iterdir() if rd.exists() else []):
         if f.is_file():
             if 'vis' in f.name and f.suffix in ['.jpg','.png']: vis.append(f.name)
             elif f.name.startswith('translated_'): trans.append(f.name)
             else: files.append({'name': f.name, 'size': f"{f.stat().st_size/1024:.1f} KB"})
-    return render_template('results.html', job_id=job_id, files=files, visualizations=vis, translated_files=trans, lang=get_lang(), translations=TRANSLATIONS[get_lang()])
+    return render_template('results.html', job_id=job_id, files=files, visualizations=vis, translated_files=trans, job_state=state, lang=get_lang(), translations=TRANSLATIONS[get_lang()])
 
 @app.route('/jobs')
 def list_jobs_page(): return render_template('jobs.html', lang=get_lang(), translations=TRANSLATIONS[get_lang()])
@@ -747,15 +1486,113 @@ def get_job_info(job_id):
     if not jp.exists(): return jsonify({'error': 'Not found'}), 404
     rd = jp / 'results'
     files, vis, trans = [], [], []
-    for f in rd.iterdir():
+    for f in (rd.iterdir() if rd.exists() else []):
         if f.is_file():
             fi = {'name': f.name, 'size': f.stat().st_size, 'url': url_for('download_file', job_id=job_id, filename=f.name), 'view_url': url_for('view_file', job_id=job_id, filename=f.name)}
             if 'vis' in f.name and f.suffix in ['.jpg','.png']: vis.append(fi)
             elif f.name.startswith('translated_'): trans.append(fi)
             else: files.append(fi)
-    return jsonify({'job_id': job_id, 'files': files, 'visualizations': vis, 'translated_files': trans, 'created': jp.stat().st_ctime})
+    return jsonify({'job_id': job_id, 'files': files, 'visualizations': vis, 'translated_files': trans, 'created': jp.stat().st_ctime, **get_job_state(job_id)})
+
+def get_job_state(job_id):
+    """Progression en mémoire du job (un job absent de job_data est terminé ou antérieur au démarrage)"""
+    with data_lock:
+        data = job_data.get(job_id)
+        if data is None:
+            return {'status': 'complete', 'progress': 100, 'current_page': None, 'total_pages': None, 'pages': [], 'combine': False}
+        return {
+            'status': data['status'], 'progress': data['progress'],
+            'current_page': data['current_page'], 'total_pages': data['total_pages'],
+            'pages': list(data['pages']), 'combine': data['combine']
+        }
+
+# =======================================================================
+# API WORKER (jobs envoyés par un front-end, stockage output/ partagé)
+# =======================================================================
+
+def worker_authorized():
+    """Un worker exige toujours le jeton partagé (les jobs reçus lancent des processus)"""
+    token = app.config['WORKER_TOKEN']
+    if not app.config['WORKER_MODE'] or not token:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Worker-Token', ''), token)
+
+@app.route('/api/worker/status')
+def worker_status():
+    if not worker_authorized(): return jsonify({'error': 'Not a worker'}), 404
+    with gpu_queue_cond:
+        queued = len(gpu_queue)
+    return jsonify({'devices': get_gpu_status(), 'queued': queued})
+
+@app.route('/api/worker/jobs', methods=['POST'])
+def worker_submit_job():
+    if not worker_authorized(): return jsonify({'error': 'Not a worker'}), 404
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        job_id = str(data['job_id'])
+        filenames = [str(f) for f in data['input_filenames']]
+        ocr_options = {'format': data['ocr_options']['format'], 'device': data['ocr_options']['device']}
+        ocr_options.update({flag: data['ocr_options'].get(flag) is True for flag in OCR_FLAGS})
+        translate_enabled = data['translate_enabled'] is True
+        target_lang, ollama_model = str(data['target_lang']), str(data['ollama_model'])
+        custom_prompt, num_ctx = str(data['custom_prompt']), int(data['num_ctx'])
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({'error': f'Invalid job payload: {e}'}), 400
+
+    # Noms de job et de fichiers : pas de chemins, uniquement des fichiers du dossier du job
+    if not job_id or secure_filename(job_id) != job_id:
+        return jsonify({'error': 'Invalid job id'}), 400
+    job_path = get_job_path(job_id)
+    if not job_path.exists(): return jsonify({'error': 'Job folder not found (output/ must be shared)'}), 404
+    if not filenames or any(not f or secure_filename(f) != f or not (job_path / f).is_file() for f in filenames):
+        return jsonify({'error': 'Invalid input filenames'}), 400
+    try:
+        build_yomitoku_cmd(ocr_options, job_path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    register_queued_job(job_id, ocr_options)
+    log_to_job(job_id, "🛰️ Job received by worker", 'info')
+    submit_job(job_id, (filenames, ocr_options, translate_enabled, target_lang, ollama_model,
+                        custom_prompt, num_ctx, job_path), True, allow_remote=False)
+    return jsonify({'job_id': job_id, 'success': True})
+
+@app.route('/api/worker/jobs/<job_id>')
+def worker_job_state(job_id):
+    if not worker_authorized(): return jsonify({'error': 'Not a worker'}), 404
+    since = request.args.get('since', 0, type=int)
+    with data_lock:
+        data = job_data.get(job_id)
+        if data is None: return jsonify({'error': 'Job not found'}), 404
+        logs = list(data['logs'])
+        first = data['log_count'] - len(logs)
+        return jsonify({
+            'logs': logs[max(0, since - first):], 'next': data['log_count'],
+            'progress': data['progress'], 'status': data['status'],
+            'current_page': data['current_page'], 'total_pages': data['total_pages'],
+            'pages': data['pages']
+        })
 
 if __name__ == '__main__':
-    print("🚀 SERVER STARTING (V3.2 - CTX OPTION)")
-    if AVAILABLE_OLLAMA_MODELS: print(f"📦 Models: {AVAILABLE_OLLAMA_MODELS}")
-    app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Yomitoku + Ollama web server')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--worker', action='store_true', help='Accept OCR jobs dispatched by a front-end')
+    parser.add_argument('--devices', help='Comma-separated GPU indices to use (default: all, "none" = dispatch only)')
+    parser.add_argument('--remote-worker', action='append', default=[], help='Worker URL to dispatch GPU jobs to (repeatable)')
+    parser.add_argument('--worker-token', default=os.environ.get('YOMITOKU_WORKER_TOKEN'),
+                        help='Shared secret between front-end and workers (or YOMITOKU_WORKER_TOKEN)')
+    args = parser.parse_args()
+    if args.worker and not args.worker_token:
+        parser.error('--worker requires --worker-token (or YOMITOKU_WORKER_TOKEN)')
+
+    app.config['WORKER_MODE'] = args.worker
+    app.config['WORKER_TOKEN'] = args.worker_token
+    if args.devices:
+        app.config['GPU_DEVICES'] = [] if args.devices == 'none' else [int(d) for d in args.devices.split(',')]
+    app.config['REMOTE_WORKERS'].extend(url.rstrip('/') for url in args.remote_worker)
+
+    print("🚀 SERVER STARTING (V3.2 - CTX OPTION)" + (" [WORKER]" if args.worker else ""))
+    print(f"🎮 GPU devices: {'auto' if app.config['GPU_DEVICES'] is None else app.config['GPU_DEVICES']}")
+    if app.config['REMOTE_WORKERS']: print(f"🛰️ Remote workers: {app.config['REMOTE_WORKERS']}")
+    app.run(debug=False, host='0.0.0.0', port=args.port)
\ No newline at end of file
@@ -0,0 +1,34 @@
+import json
+import statistics
+import subprocess
+import sys
+
+# Chaque mesure tourne dans un interpréteur neuf (démarrage à froid, comme un worker gunicorn)
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+client.get('/api/jobs')
+t2 = time.perf_counter()
+client.get('/')
+t3 = time.perf_counter()
+heavy = [m for m in ('torch', 'pypdfium2', 'reportlab') if m in sys.modules]
+print(json.dumps({'import': t1 - t0, 'first_api': t2 - t1, 'first_page': t3 - t2, 'heavy': heavy}))
+"""
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+print("=== STARTUP BENCHMARK ===")
+results = []
+for _ in range(RUNS):
+    out = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True)
+    line = next(l for l in out.stdout.splitlines() if l.startswith('{'))
+    results.append(json.loads(line))
+
+for key, label in [('import', 'import app'), ('first_api', 'first /api/jobs'), ('first_page', 'first / (index)')]:
+    values = [r[key] * 1000 for r in results]
+    print(f"{label:<18} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+print(f"Heavy modules loaded at startup: {results[-1]['heavy'] or 'none'}")
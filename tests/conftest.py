@@ -0,0 +1,51 @@
+from concurrent.futures import Future
+
+import pytest
+
+import app as yomitoku_app
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Module app isolé : dossier output/ temporaire, files et états remis à zéro"""
+    monkeypatch.setitem(yomitoku_app.app.config, 'OUTPUT_FOLDER', str(tmp_path / 'output'))
+    (tmp_path / 'output').mkdir()
+    for state in (yomitoku_app.queued_work, yomitoku_app.seconds_per_page, yomitoku_app.job_data):
+        state.clear()
+    yomitoku_app.gpu_busy.clear()
+    yomitoku_app.gpu_queue.clear()
+    monkeypatch.setattr(yomitoku_app, 'force_unload_ollama', lambda job_id=None: None)
+    yield yomitoku_app
+    yomitoku_app.queued_work.clear()
+    yomitoku_app.job_data.clear()
+
+
+@pytest.fixture
+def blocked_jobs(server, monkeypatch):
+    """Remplace le lancement des jobs par un Future jamais démarré : les jobs acceptés restent en file"""
+    submitted = []
+    futures = []
+
+    def fake_submit(job_id, *args, **kwargs):
+        submitted.append(job_id)
+        futures.append(Future())
+        return futures[-1]
+
+    monkeypatch.setattr(server, 'submit_job', fake_submit)
+    yield submitted
+    for future in futures:
+        future.set_result(None)
+
+
+@pytest.fixture
+def make_pdf():
+    """Fabrique un PDF de pages blanches : make_pdf(path, pages)"""
+    def make(path, pages):
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument.new()
+        for _ in range(pages):
+            pdf.new_page(200, 200)
+        pdf.save(str(path))
+        pdf.close()
+        return path
+    return make
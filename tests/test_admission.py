@@ -0,0 +1,122 @@
+import io
+
+import pytest
+
+
+@pytest.fixture
+def limits(server, monkeypatch):
+    config = server.app.config
+    monkeypatch.setitem(config, 'DEFAULT_SECONDS_PER_PAGE', {'cuda': 10.0, 'cpu': 100.0})
+    monkeypatch.setitem(config, 'MAX_CONCURRENT_JOBS', 1)
+    monkeypatch.setitem(config, 'MAX_QUEUE_WAIT', 150)
+    monkeypatch.setitem(config, 'MAX_QUEUED_JOBS', 50)
+    monkeypatch.setitem(config, 'SESSION_MAX_JOBS', 3)
+    monkeypatch.setitem(config, 'SESSION_MAX_PAGES', 5)
+    return config
+
+
+def upload(client, filename='page.png', data=b'x', device='cpu'):
+    return client.post('/upload', data={'file': (io.BytesIO(data), filename), 'device': device})
+
+
+@pytest.fixture
+def upload_pdf(make_pdf, tmp_path):
+    def upload_pages(client, pages):
+        path = make_pdf(tmp_path / f'doc{pages}.pdf', pages)
+        return upload(client, 'doc.pdf', path.read_bytes())
+    return upload_pages
+
+
+def test_accepted_upload_is_queued(server, limits, blocked_jobs):
+    client = server.app.test_client()
+    response = upload(client)
+    assert response.status_code == 200
+    job_id = response.json['job_id']
+    assert server.queued_work[job_id]['pages'] == 1
+
+    state = client.get(f'/api/job/{job_id}').json
+    assert state['status'] == 'queued'
+    assert client.get(f'/results/{job_id}').status_code == 200
+
+
+def test_session_quota_returns_429_with_retry_after(server, limits, blocked_jobs):
+    limits['SESSION_MAX_JOBS'] = 1
+    limits['MAX_QUEUE_WAIT'] = 3600
+    client = server.app.test_client()
+    assert upload(client).status_code == 200
+
+    response = upload(client)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 30
+    assert response.json['retry_after'] == int(response.headers['Retry-After'])
+
+    # Une autre session n'est pas concernée par ce quota
+    assert upload(server.app.test_client()).status_code == 200
+
+
+def test_saturated_queue_returns_503_with_retry_after(server, limits, blocked_jobs):
+    assert upload(server.app.test_client()).status_code == 200
+
+    response = upload(server.app.test_client())
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 30
+    assert response.json['estimated_wait'] == 200
+
+
+def test_large_job_is_admitted_when_queue_is_empty(server, limits, blocked_jobs, upload_pdf):
+    # 3 pages x 100 s > MAX_QUEUE_WAIT, mais rien d'autre n'attend
+    response = upload_pdf(server.app.test_client(), 3)
+    assert response.status_code == 200
+    assert response.json['pages'] == 3
+
+
+def test_job_over_session_page_limit_is_not_retryable(server, limits, blocked_jobs, upload_pdf, tmp_path):
+    response = upload_pdf(server.app.test_client(), 6)
+    assert response.status_code == 413
+    assert 'Retry-After' not in response.headers
+    assert 'retry_after' not in response.json
+    assert list((tmp_path / 'output').iterdir()) == []
+
+
+def test_refused_upload_is_removed_from_disk(server, limits, blocked_jobs):
+    limits['SESSION_MAX_PAGES'] = 1
+    client = server.app.test_client()
+    assert upload(client).status_code == 200
+    assert upload(client).status_code == 429
+    assert len(list(server.get_job_path('x').parent.iterdir())) == 1
+
+
+def test_admit_job_is_atomic_per_session(server, limits):
+    limits['SESSION_MAX_JOBS'] = 1
+    assert server.admit_job('a', 'sid', 'cpu', 1) is None
+    rejected = server.admit_job('b', 'sid', 'cpu', 1)
+    assert rejected[0] == 429
+    assert set(server.queued_work) == {'a'}
+
+
+def test_throughput_is_learned_per_device(server, limits):
+    server.record_throughput('cuda:0', 10, 20.0)
+    server.record_throughput('cuda:1', 10, 40.0)
+    assert server.get_seconds_per_page('cuda') == pytest.approx(3.0)
+    assert server.get_seconds_per_page('cpu') == 100.0
+
+
+def test_gpu_parallelism_is_capped_by_executor_threads(server, limits, monkeypatch):
+    limits['MAX_CONCURRENT_JOBS'] = 4
+    monkeypatch.setitem(limits, 'GPU_DEVICES', list(range(8)))
+    assert server.admission_capacity('cuda') == (10.0, 4)
+
+    limits['GPU_DEVICES'] = [0]
+    monkeypatch.setitem(limits, 'REMOTE_WORKERS', ['http://gpu-node-2:5001'])
+    assert server.admission_capacity('cuda') == (10.0, 2)
+
+
+def test_upload_detects_gpus_once(server, limits, blocked_jobs, monkeypatch):
+    calls = []
+    monkeypatch.setitem(limits, 'GPU_DEVICES', None)
+    monkeypatch.setattr(server, 'detected_gpu_devices', None)
+    monkeypatch.setattr(server, 'query_gpu_memory', lambda: calls.append(1) or {0: (8.0, 16.0)})
+    client = server.app.test_client()
+    assert upload(client, device='cuda').status_code == 200
+    assert upload(server.app.test_client(), device='cuda').status_code == 200
+    assert len(calls) == 1
@@ -0,0 +1,168 @@
+import os
+import re
+import signal
+import time
+
+import pytest
+
+
+@pytest.fixture
+def pdf_pool(server, monkeypatch):
+    """Pool PDF neuf pour le test, arrêté à la fin"""
+    monkeypatch.setitem(server.app.config, 'PDF_WORKERS', 2)
+    monkeypatch.setitem(server.app.config, 'PDF_PAGES_PER_TASK', 1)
+    monkeypatch.setattr(server, 'pdf_pool', None)
+    yield
+    if server.pdf_pool is not None:
+        server.pdf_pool.shutdown(wait=True, cancel_futures=True)
+
+
+@pytest.fixture
+def translator(server, monkeypatch, tmp_path):
+    """translate_pdf_file avec une traduction factice ; retourne (fonction, dossier results/)"""
+    monkeypatch.setattr(server, 'wait_for_vram', lambda *args, **kwargs: True)
+    monkeypatch.setattr(server, 'translate_with_ollama', lambda text, *args, **kwargs: f"FR {text.strip()}")
+    results_dir = server.get_job_path('job1') / 'results'
+    results_dir.mkdir(parents=True)
+    server.register_queued_job('job1', {})
+
+    def translate(pdf_path):
+        server.translate_pdf_file(pdf_path, results_dir, 'fr', 'm', '', 4096, 'job1', 'md')
+    return translate, results_dir
+
+
+def pages(server, pdf_path):
+    return [page for page, _ in server.iter_pdf_pages(pdf_path, server.pdf_page_count(pdf_path))]
+
+
+def test_broken_pool_is_replaced(server, pdf_pool, make_pdf, tmp_path):
+    pdf_path = make_pdf(tmp_path / 'doc.pdf', 3)
+    assert pages(server, pdf_path) == [1, 2, 3]
+
+    # Un processus fils meurt (ex: crash pdfium sur un PDF malformé)
+    broken = server.pdf_pool
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+    time.sleep(0.5)
+
+    assert pages(server, pdf_path) == [1, 2, 3]
+    assert server.pdf_pool is not broken
+
+
+def test_failed_extraction_leaves_no_translated_file(server, pdf_pool, translator, tmp_path):
+    translate, results_dir = translator
+    source = results_dir / 'doc.pdf'
+    source.write_bytes(b'%PDF-1.7 not really a pdf')
+    with pytest.raises(Exception):
+        translate(source)
+    assert sorted(p.name for p in results_dir.iterdir()) == ['doc.pdf']
+    assert list(results_dir.parent.glob('*.part')) == []
+
+
+def test_failed_rerun_keeps_previous_translation(server, pdf_pool, translator, make_pdf):
+    translate, results_dir = translator
+    source = make_pdf(results_dir / 'doc.pdf', 2)
+    translate(source)
+    html_file = results_dir / 'translated_fr_doc.pdf.html'
+    previous = html_file.read_text(encoding='utf-8')
+
+    source.write_bytes(b'%PDF-1.7 corrupted since')
+    with pytest.raises(Exception):
+        translate(source)
+    assert html_file.read_text(encoding='utf-8') == previous
+
+
+def test_empty_pdf_still_gets_a_complete_html(server, pdf_pool, translator, make_pdf, monkeypatch):
+    translate, results_dir = translator
+    monkeypatch.setattr(server, 'pdf_page_count', lambda pdf_path: 0)  # pdfium refuse d'ouvrir un PDF sans page
+    translate(make_pdf(results_dir / 'empty.pdf', 1))
+    html_text = (results_dir / 'translated_fr_empty.pdf.html').read_text(encoding='utf-8')
+    assert html_text.startswith('<!DOCTYPE html>')
+    assert html_text.endswith('</html>')
+
+
+def pdf_text(path):
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        return [pdf[i].get_textpage().get_text_range() for i in range(len(pdf))]
+    finally:
+        pdf.close()
+
+
+def test_untranslated_page_keeps_japanese_text_readable(server, translator, monkeypatch):
+    translate, results_dir = translator
+    source_text = '日本語のテキスト' * 40
+    monkeypatch.setattr(server, 'pdf_page_count', lambda pdf_path: 1)
+    monkeypatch.setattr(server, 'iter_pdf_pages', lambda pdf_path, total: iter([(1, source_text)]))
+    monkeypatch.setattr(server, 'translate_with_ollama', lambda *args, **kwargs: '❌ Ollama timeout')
+    translate(results_dir / 'doc.pdf')
+
+    [page] = pdf_text(results_dir / 'translated_fr_doc.pdf')
+    lines = page.split('\r\n')
+    assert lines[0] == 'Page 1'
+    assert ''.join(lines[1:]) == source_text  # pas de ■ : police CID
+    assert len(lines) > 2  # texte sans espaces coupé au caractère
+
+
+def test_wrap_prefers_spaces_and_fits_width(server):
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    lines = server.wrap_pdf_text('word ' * 50, 'Helvetica', 10, 200)
+    assert all(line.split() == ['word'] * len(line.split()) for line in lines)
+    assert all(stringWidth(line, 'Helvetica', 10) <= 200 for line in lines)
+    assert server.wrap_pdf_text('', 'Helvetica', 10, 200) == ['']
+
+
+@pytest.fixture
+def text_pdf(tmp_path):
+    """PDF source avec une ligne de texte par page ('' = page blanche)"""
+    def make(path, texts):
+        from reportlab.pdfgen import canvas
+        pdf = canvas.Canvas(str(path))
+        for text in texts:
+            pdf.drawString(72, 720, text)
+            pdf.showPage()
+        pdf.save()
+        return path
+    return make
+
+
+def sections(html_text):
+    return re.findall(r'<section class="([^"]+)" id="page-(\d+)">\s*<h2>Page \d+</h2>\s*<div class="content">(.*?)</div>', html_text)
+
+
+def test_pages_are_translated_in_order(server, pdf_pool, translator, text_pdf):
+    translate, results_dir = translator
+    texts = [f'source page {n}' for n in range(1, 8)]
+    translate(text_pdf(results_dir / 'doc.pdf', texts))
+
+    html_text = (results_dir / 'translated_fr_doc.pdf.html').read_text(encoding='utf-8')
+    assert sections(html_text) == [('page', str(n), f'FR source page {n}') for n in range(1, 8)]
+    assert [line.split('\r\n')[1] for line in pdf_text(results_dir / 'translated_fr_doc.pdf')] == \
+        [f'FR source page {n}' for n in range(1, 8)]
+    assert list(results_dir.parent.glob('*.part')) == []
+
+
+def test_blank_pages_keep_their_anchor(server, pdf_pool, translator, text_pdf):
+    translate, results_dir = translator
+    translate(text_pdf(results_dir / 'doc.pdf', ['first', '', 'third']))
+
+    html_text = (results_dir / 'translated_fr_doc.pdf.html').read_text(encoding='utf-8')
+    assert re.findall(r'<nav>(.*)</nav>', html_text) == [''.join(f'<a href="#page-{n}">{n}</a>' for n in (1, 2, 3))]
+    assert sections(html_text) == [('page', '1', 'FR first'), ('page', '2', ''), ('page', '3', 'FR third')]
+    assert len(pdf_text(results_dir / 'translated_fr_doc.pdf')) == 3
+
+
+def test_failed_page_is_kept_untranslated(server, pdf_pool, translator, text_pdf, monkeypatch):
+    translate, results_dir = translator
+    monkeypatch.setattr(server, 'translate_with_ollama',
+                        lambda text, *args, **kwargs: '❌ Ollama timeout' if '2' in text else f"FR {text.strip()}")
+    translate(text_pdf(results_dir / 'doc.pdf', ['page 1', 'page 2 & <b>', 'page 3']))
+
+    html_text = (results_dir / 'translated_fr_doc.pdf.html').read_text(encoding='utf-8')
+    assert sections(html_text) == [('page', '1', 'FR page 1'), ('page untranslated', '2', 'page 2 &amp; &lt;b&gt;'),
+                                   ('page', '3', 'FR page 3')]
+    messages = [log['message'] for log in server.job_data['job1']['logs']]
+    assert '✅ Translated 2 page(s) (Saved as HTML): translated_fr_doc.pdf.html' in messages
+    assert '⚠️ 1 page(s) kept untranslated in translated_fr_doc.pdf.html' in messages
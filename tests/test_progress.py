@@ -0,0 +1,151 @@
+import io
+import json
+
+import pytest
+
+# Module yomitoku.cli.main minimal : mêmes points d'accroche que ceux patchés par yomitoku_progress.py
+FAKE_CLI = '''
+import argparse
+import time
+from pathlib import Path
+
+
+def _sanitize_path_component(name):
+    return name.replace(" ", "_")
+
+
+def load_image(path):
+    return [str(path)]
+
+
+def load_pdf(path):
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(str(path))
+    try:
+        return [f"{path}#{index}" for index in range(len(pdf))]
+    finally:
+        pdf.close()
+
+
+class DocumentAnalyzer:
+    def __call__(self, img):
+        time.sleep(0.05)
+        return img
+
+
+def process_single_file(args, analyzer, path, format):
+    imgs = load_pdf(path) if path.suffix == ".pdf" else load_image(path)
+    prefix = f"{_sanitize_path_component(path.parent.name)}_{path.stem}"
+    for page, img in enumerate(imgs, 1):
+        analyzer(img)
+        (Path(args.outdir) / f"{prefix}_p{page}.{format}").write_text(img)
+        print(f"exported page {page}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("arg1")
+    parser.add_argument("-f", "--format")
+    parser.add_argument("-o", "--outdir")
+    parser.add_argument("-d", "--device")
+    parser.add_argument("-l", "--lite", action="store_true")
+    args = parser.parse_args()
+    Path(args.outdir).mkdir(parents=True, exist_ok=True)
+    process_single_file(args, DocumentAnalyzer(), Path(args.arg1), args.format)
+'''
+
+
+@pytest.fixture
+def fake_yomitoku(tmp_path, monkeypatch):
+    """Paquet yomitoku factice sur le PYTHONPATH du sous-processus OCR"""
+    package = tmp_path / 'fake' / 'yomitoku' / 'cli'
+    package.mkdir(parents=True)
+    (package.parent / '__init__.py').write_text('')
+    (package / '__init__.py').write_text('')
+    (package / 'main.py').write_text(FAKE_CLI)
+    monkeypatch.setenv('PYTHONPATH', str(tmp_path / 'fake'))
+
+
+@pytest.fixture
+def accounting(server, monkeypatch):
+    """Enregistre les appels à mark_pages_done et record_throughput"""
+    calls = {'done': [], 'throughput': []}
+    mark_pages_done, record_throughput = server.mark_pages_done, server.record_throughput
+
+    def mark(job_id, pages):
+        calls['done'].append(pages)
+        mark_pages_done(job_id, pages)
+
+    def record(device_key, pages, elapsed):
+        calls['throughput'].append((device_key, pages))
+        record_throughput(device_key, pages, elapsed)
+
+    monkeypatch.setattr(server, 'mark_pages_done', mark)
+    monkeypatch.setattr(server, 'record_throughput', record)
+    return calls
+
+
+def test_ocr_progress_is_reported_per_page(server, fake_yomitoku, accounting, make_pdf):
+    job_path = server.get_job_path('job1')
+    job_path.mkdir()
+    make_pdf(job_path / 'doc.pdf', 3)
+    assert server.admit_job('job1', 'sid', 'cpu', 3) is None
+    server.register_queued_job('job1', {})
+
+    base_cmd = server.build_yomitoku_cmd({'format': 'md', 'device': 'cpu'}, job_path)
+    server.run_yomitoku_job('job1', ['doc.pdf'], base_cmd, False, 'fr', 'm', '', 4096, job_path, 'md')
+
+    state = server.get_job_state('job1')
+    assert state['status'] == 'complete'
+    assert (state['current_page'], state['total_pages']) == (3, 3)
+    assert [(p['file'], p['page'], p['total_pages']) for p in state['pages']] == [('doc.pdf', n, 3) for n in (1, 2, 3)]
+    assert [p['files'] for p in state['pages']] == [[f'job1_doc_p{n}.md'] for n in (1, 2, 3)]
+    assert all(p['seconds'] > 0 for p in state['pages'])
+
+    # Une mise à jour par page (pas d'estimation globale en fin de fichier)
+    assert accounting['done'] == [1, 1, 1, 0]
+    assert server.queued_work['job1']['done'] == 3
+    assert accounting['throughput'] == [('cpu', 1)] * 3
+    assert server.seconds_per_page['cpu'] > 0
+
+    messages = [log['message'] for log in server.job_data['job1']['logs']]
+    assert '📑 [doc.pdf] 3 page(s) to analyze' in messages
+    assert '[doc.pdf] exported page 2' in messages
+
+
+def test_malformed_progress_lines_are_ignored(server, accounting):
+    server.register_queued_job('job1', {})
+    event = {'event': 'page', 'file': 'doc.pdf', 'page': 1, 'total_pages': 1, 'seconds': 0.5, 'files': []}
+    reader = io.StringIO('Traceback (most recent call last)\n' + json.dumps(event) + '\n')
+    pages_seen = []
+    server.consume_progress('job1', reader, 'doc.pdf', 0, 1, 'cpu', pages_seen)
+    assert pages_seen == [1]
+    assert accounting['done'] == [1]
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data, self.status_code = data, status_code
+
+    def json(self):
+        return self.data
+
+
+def test_remote_pages_are_marked_done_as_they_arrive(server, accounting, monkeypatch):
+    page = {'file': 'doc.pdf', 'total_pages': 2, 'seconds': 1.0, 'files': []}
+    polls = iter([
+        {'logs': [], 'next': 0, 'progress': 50, 'status': 'running', 'current_page': 1, 'total_pages': 2,
+         'pages': [dict(page, page=1)]},
+        {'logs': [], 'next': 0, 'progress': 100, 'status': 'complete', 'current_page': 2, 'total_pages': 2,
+         'pages': [dict(page, page=1), dict(page, page=2)]},
+    ])
+    monkeypatch.setattr(server.requests, 'post', lambda *args, **kwargs: FakeResponse({'success': True}))
+    monkeypatch.setattr(server.requests, 'get', lambda *args, **kwargs: FakeResponse(next(polls)))
+    assert server.admit_job('job1', 'sid', 'cuda', 2) is None
+    server.register_queued_job('job1', {})
+
+    server.run_remote_job('http://gpu-node-2:5001', 'job1', {})
+
+    assert accounting['done'] == [1, 1]
+    assert server.queued_work['job1']['done'] == 2
+    assert server.get_job_state('job1')['status'] == 'complete'
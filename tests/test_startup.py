@@ -0,0 +1,8 @@
+def test_index_does_not_wait_for_ollama(server, monkeypatch):
+    calls = []
+    monkeypatch.setattr(server.requests, 'get', lambda *args, **kwargs: calls.append(args) or 1 / 0)
+    response = server.app.test_client().get('/')
+    assert response.status_code == 200
+    assert b'/api/ollama/models' in response.data
+    assert calls == []
+
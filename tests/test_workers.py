@@ -0,0 +1,235 @@
+import io
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+
+TOKEN = 'test-token'
+
+
+@pytest.fixture
+def two_gpus(server, monkeypatch):
+    """Deux GPU simulés : le GPU 1 a plus de mémoire libre que le GPU 0"""
+    memory = {0: (4.0, 16.0), 1: (10.0, 16.0)}
+    monkeypatch.setitem(server.app.config, 'GPU_DEVICES', None)
+    monkeypatch.setattr(server, 'detected_gpu_devices', None)
+    monkeypatch.setattr(server, 'query_gpu_memory', lambda: dict(memory))
+    return memory
+
+
+def test_gpu_status_queries_all_devices_at_once(server, monkeypatch):
+    calls = []
+
+    def check_output(cmd, **kwargs):
+        calls.append(cmd)
+        return b"0, 4096, 16384\n1, 10240, 16384\n"
+
+    monkeypatch.setitem(server.app.config, 'GPU_DEVICES', None)
+    monkeypatch.setattr(server, 'detected_gpu_devices', None)
+    monkeypatch.setattr(server.subprocess, 'check_output', check_output)
+    server.gpu_busy.add(0)
+    assert server.get_gpu_status() == [
+        {'index': 0, 'free_gb': 4.0, 'total_gb': 16.0, 'busy': True},
+        {'index': 1, 'free_gb': 10.0, 'total_gb': 16.0, 'busy': False},
+    ]
+    assert len(calls) == 2  # détection des GPU + mémoire, jamais un appel par GPU
+    server.get_gpu_status()
+    assert len(calls) == 3  # liste des GPU en cache
+    assert 'torch' not in sys.modules
+
+
+def test_acquire_picks_free_device_with_most_memory(server, two_gpus):
+    assert server.acquire_gpu_device() == 1
+    assert server.acquire_gpu_device() == 0
+    assert server.acquire_gpu_device() is None
+
+    server.release_gpu_device(1)
+    assert server.acquire_gpu_device() == 1
+    server.release_gpu_device(0)
+    server.release_gpu_device(1)
+    assert server.gpu_busy == set()
+
+
+JOB_OPTIONS = {'format': 'md', 'device': 'cuda', 'lite': True}
+
+
+def job_args(server, job_id):
+    return (['a.png'], dict(JOB_OPTIONS), False, 'fr', 'm', '', 4096, server.get_job_path(job_id))
+
+
+def test_job_is_pinned_to_acquired_device_and_releases_it(server, two_gpus, monkeypatch):
+    seen = {}
+
+    def fake_run(job_id, input_filenames, base_cmd, *args, gpu_device=None):
+        seen['device'] = gpu_device
+        seen['busy'] = set(server.gpu_busy)
+        seen['cmd'] = base_cmd
+
+    monkeypatch.setattr(server, 'run_yomitoku_job', fake_run)
+    server.register_queued_job('job1', JOB_OPTIONS)
+    server.submit_job('job1', job_args(server, 'job1'), True).result(timeout=10)
+
+    assert seen['device'] == 1
+    assert seen['busy'] == {1}
+    assert seen['cmd'] == ['yomitoku', '-f', 'md', '-o', str(server.get_job_path('job1') / 'results'), '-d', 'cuda', '-l']
+    assert server.gpu_busy == set()
+
+
+def test_gpu_jobs_wait_for_a_device_without_blocking_cpu_jobs(server, monkeypatch):
+    monkeypatch.setitem(server.app.config, 'GPU_DEVICES', [0])
+    monkeypatch.setattr(server, 'query_gpu_memory', lambda: {0: (8.0, 16.0)})
+    ran = []
+    monkeypatch.setattr(server, 'run_yomitoku_job', lambda job_id, *args, gpu_device=None: ran.append((job_id, gpu_device)))
+    assert server.acquire_gpu_device() == 0  # GPU occupé par un autre job
+
+    server.register_queued_job('gpu-job', JOB_OPTIONS)
+    server.register_queued_job('cpu-job', JOB_OPTIONS)
+    gpu_future = server.submit_job('gpu-job', job_args(server, 'gpu-job'), True)
+    server.submit_job('cpu-job', job_args(server, 'cpu-job'), False).result(timeout=10)
+    time.sleep(0.5)
+    assert ran == [('cpu-job', None)]
+    assert not gpu_future.done()
+    assert server.get_job_state('gpu-job')['status'] == 'queued'
+
+    server.release_gpu_device(0)
+    gpu_future.result(timeout=10)
+    assert ran == [('cpu-job', None), ('gpu-job', 0)]
+    assert server.gpu_busy == set()
+
+
+def test_gpu_job_fails_when_no_gpu_can_ever_run_it(server, monkeypatch):
+    monkeypatch.setitem(server.app.config, 'GPU_DEVICES', [])
+    monkeypatch.setitem(server.app.config, 'REMOTE_WORKERS', [])
+    server.register_queued_job('job1', JOB_OPTIONS)
+    server.submit_job('job1', job_args(server, 'job1'), True).result(timeout=10)
+    assert server.get_job_state('job1')['status'] == 'error'
+
+
+@pytest.fixture
+def worker_client(server, monkeypatch):
+    monkeypatch.setitem(server.app.config, 'WORKER_MODE', True)
+    monkeypatch.setitem(server.app.config, 'WORKER_TOKEN', TOKEN)
+    job_path = server.get_job_path('job1')
+    job_path.mkdir()
+    (job_path / 'a.png').write_bytes(b'x')
+    return server.app.test_client()
+
+
+def job_payload(**overrides):
+    payload = {
+        'job_id': 'job1', 'input_filenames': ['a.png'], 'ocr_options': {'format': 'md', 'device': 'cuda'},
+        'translate_enabled': False, 'target_lang': 'fr', 'ollama_model': 'm', 'custom_prompt': '', 'num_ctx': 4096
+    }
+    payload.update(overrides)
+    return payload
+
+
+def test_worker_api_requires_token(worker_client, server, monkeypatch):
+    assert worker_client.get('/api/worker/status').status_code == 404
+    assert worker_client.get('/api/worker/status', headers={'X-Worker-Token': 'wrong'}).status_code == 404
+
+    monkeypatch.setitem(server.app.config, 'WORKER_TOKEN', None)
+    assert worker_client.get('/api/worker/status', headers={'X-Worker-Token': ''}).status_code == 404
+
+
+@pytest.mark.parametrize('overrides', [
+    {'input_filenames': ['../../app.py']},
+    {'input_filenames': ['missing.png']},
+    {'job_id': '../job1'},
+    {'ocr_options': {'format': 'md -o /tmp', 'device': 'cuda'}},
+    {'ocr_options': {'format': 'md', 'device': 'cuda --outdir /tmp'}},
+])
+def test_worker_rejects_unsafe_payloads(worker_client, blocked_jobs, overrides):
+    response = worker_client.post('/api/worker/jobs', json=job_payload(**overrides), headers={'X-Worker-Token': TOKEN})
+    assert response.status_code == 400
+    assert blocked_jobs == []
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+WORKER_SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+import app
+
+def fake_run(job_id, input_filenames, base_cmd, *args, gpu_device=None):
+    results = app.get_job_path(job_id) / 'results'
+    results.mkdir(exist_ok=True)
+    for page in (1, 2):
+        (results / f'page_p{{page}}.md').write_text('ok')
+        with app.data_lock:
+            app.job_data[job_id]['pages'].append({{'file': input_filenames[0], 'page': page, 'total_pages': 2,
+                                                   'seconds': 0.1, 'files': [f'page_p{{page}}.md']}})
+    app.log_to_job(job_id, f'stub ran on GPU {{gpu_device}}: {{base_cmd}}', 'info')
+    with app.data_lock:
+        app.job_data[job_id]['status'] = 'complete'
+        app.job_data[job_id]['progress'] = 100
+
+app.run_yomitoku_job = fake_run
+app.force_unload_ollama = lambda job_id=None: None
+app.get_gpu_memory_info = lambda device=None: (8.0, 16.0)
+app.query_gpu_memory = lambda: {{0: (8.0, 16.0)}}
+app.app.config.update(WORKER_MODE=True, WORKER_TOKEN={token!r}, GPU_DEVICES=[0])
+app.app.run(host='127.0.0.1', port={port})
+'''
+
+
+@pytest.fixture
+def remote_worker(tmp_path):
+    """Worker stand-in dans un autre processus, partageant tmp_path/output avec le front-end"""
+    port = free_port()
+    script = tmp_path / 'worker.py'
+    script.write_text(WORKER_SCRIPT.format(root=str(ROOT), token=TOKEN, port=port))
+    process = subprocess.Popen([sys.executable, str(script)], cwd=tmp_path,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f'{url}/api/worker/status', headers={'X-Worker-Token': TOKEN}, timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_round_trip_through_remote_worker(server, remote_worker, monkeypatch, tmp_path):
+    config = server.app.config
+    monkeypatch.setitem(config, 'REMOTE_WORKERS', [remote_worker])
+    monkeypatch.setitem(config, 'WORKER_TOKEN', TOKEN)
+    monkeypatch.setitem(config, 'GPU_DEVICES', [])  # Front-end sans GPU : tout part vers le worker
+
+    status = requests.get(f'{remote_worker}/api/worker/status', headers={'X-Worker-Token': TOKEN}).json()
+    assert status == {'devices': [{'index': 0, 'free_gb': 8.0, 'total_gb': 16.0, 'busy': False}], 'queued': 0}
+
+    client = server.app.test_client()
+    response = client.post('/upload', data={'file': (io.BytesIO(b'x'), 'scan.png'), 'device': 'cuda'})
+    assert response.status_code == 200
+    job_id = response.json['job_id']
+
+    for _ in range(100):
+        state = client.get(f'/api/job/{job_id}').json
+        if state['status'] in ['complete', 'error']:
+            break
+        time.sleep(0.1)
+
+    assert state['status'] == 'complete'
+    assert [p['page'] for p in state['pages']] == [1, 2]
+    assert sorted(f['name'] for f in state['files']) == ['page_p1.md', 'page_p2.md']
+    messages = [log['message'] for log in server.job_data[job_id]['logs']]
+    # Le worker force -o dans son propre dossier output/ (partagé avec le front-end)
+    assert any('stub ran on GPU 0' in m and f"'-o', 'output/{job_id}/results'" in m for m in messages)
+    assert (tmp_path / 'output' / job_id / 'results' / 'page_p2.md').exists()
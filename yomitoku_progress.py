@@ -0,0 +1,93 @@
+"""Lance la CLI yomitoku en émettant des événements de progression structurés.
+
+Mêmes arguments que la commande `yomitoku`. Les événements (une ligne JSON chacun)
+sont écrits sur le descripteur YOMITOKU_PROGRESS_FD (ou le handle Windows
+YOMITOKU_PROGRESS_HANDLE), séparément des logs stdout/stderr :
+
+    {"event": "document", "file": ..., "total_pages": N}
+    {"event": "page", "file": ..., "page": n, "total_pages": N, "seconds": t, "files": [...]}
+    {"event": "done", "file": ..., "pages": N, "seconds": t}
+"""
+import json
+import os
+import time
+
+from yomitoku.cli import main as cli
+
+
+def open_channel():
+    handle = os.environ.get('YOMITOKU_PROGRESS_HANDLE')
+    fd = os.environ.get('YOMITOKU_PROGRESS_FD')
+    if handle:
+        import msvcrt
+        fd = msvcrt.open_osfhandle(int(handle), os.O_WRONLY)
+    if fd is None:
+        return None
+    return os.fdopen(int(fd), 'w', encoding='utf-8', buffering=1)
+
+
+channel = open_channel()
+state = {'file': None, 'outdir': None, 'prefix': None, 'page': 0, 'total_pages': 0, 'page_start': None}
+
+
+def emit(event, **data):
+    if channel is None:
+        return
+    channel.write(json.dumps({'event': event, 'file': state['file'], **data}) + '\n')
+    channel.flush()
+
+
+def page_files(page):
+    """Fichiers de résultat déjà écrits pour cette page (ex: dir_doc_p3.md, dir_doc_p3_ocr.jpg)"""
+    prefix = f"{state['prefix']}_p{page}"
+    try:
+        names = os.listdir(state['outdir'])
+    except OSError:
+        return []
+    return sorted(n for n in names if n.startswith(prefix + '.') or n.startswith(prefix + '_'))
+
+
+def finish_page():
+    """La page courante est terminée (analyse + export) : on l'annonce"""
+    if state['page_start'] is None:
+        return
+    emit('page', page=state['page'], total_pages=state['total_pages'],
+         seconds=round(time.time() - state['page_start'], 3), files=page_files(state['page']))
+    state['page_start'] = None
+
+
+def counting_loader(loader):
+    def load(*args, **kwargs):
+        imgs = loader(*args, **kwargs)
+        state['total_pages'] = len(imgs)
+        emit('document', total_pages=len(imgs))
+        return imgs
+    return load
+
+
+class ProgressAnalyzer(cli.DocumentAnalyzer):
+    def __call__(self, img):
+        # L'export de la page précédente est fini quand l'analyse suivante commence
+        finish_page()
+        state['page'] += 1
+        state['page_start'] = time.time()
+        return super().__call__(img)
+
+
+def process_single_file(args, analyzer, path, format):
+    state.update(file=path.name, outdir=args.outdir, page=0, total_pages=0, page_start=None,
+                 prefix=f"{cli._sanitize_path_component(path.parent.name)}_{path.stem}")
+    start = time.time()
+    original_process_single_file(args, analyzer, path, format)
+    finish_page()
+    emit('done', pages=state['page'], seconds=round(time.time() - start, 3))
+
+
+original_process_single_file = cli.process_single_file
+cli.process_single_file = process_single_file
+cli.load_pdf = counting_loader(cli.load_pdf)
+cli.load_image = counting_loader(cli.load_image)
+cli.DocumentAnalyzer = ProgressAnalyzer
+
+if __name__ == '__main__':
+    cli.main()